@@ -0,0 +1,44 @@
+import time
+import numpy as np
+from screen_delta import TileEncoder, TileDecoder, encode_jpeg
+
+# synthetic "desktop": static background, a blinking cursor and a small window dragged around
+W, H = 1920, 1080
+FRAMES = 200
+
+def make_frames():
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (H // 8, W // 8, 3), dtype=np.uint8).repeat(8, 0).repeat(8, 1)
+    window = rng.integers(0, 255, (200, 300, 3), dtype=np.uint8)
+    for i in range(FRAMES):
+        frame = base.copy()
+        if i % 10 < 5:
+            frame[500:520, 900:902] = 255
+        x = 100 + (i * 7) % 1200
+        frame[300:500, x:x + 300] = window
+        yield frame
+
+def bench_full():
+    total, start = 0, time.perf_counter()
+    for frame in make_frames():
+        total += len(encode_jpeg(frame))
+    return total, time.perf_counter() - start
+
+def bench_delta():
+    enc, dec = TileEncoder(), TileDecoder()
+    total, sent, start = 0, 0, time.perf_counter()
+    for frame in make_frames():
+        packet = enc.encode_frame(frame)
+        if packet is not None:
+            total += len(packet)
+            sent += 1
+            dec.apply(packet)
+    return total, time.perf_counter() - start, sent
+
+if __name__ == "__main__":
+    full_bytes, full_time = bench_full()
+    delta_bytes, delta_time, sent = bench_delta()
+    print(f"{FRAMES} frames at {W}x{H}")
+    print(f"full JPEG : {full_bytes / 1e6:8.2f} MB  {full_time:6.2f} s")
+    print(f"tile delta: {delta_bytes / 1e6:8.2f} MB  {delta_time:6.2f} s  ({sent} packets)")
+    print(f"bandwidth x{full_bytes / max(delta_bytes, 1):.1f}, cpu x{full_time / max(delta_time, 1e-9):.1f}")
@@ -0,0 +1,93 @@
+import collections
+import os
+
+FLUSH_MS = 33        # coalesce inserts to about one per frame
+MAX_LINES = 2000     # lines kept in the Text widget while following the chat
+PAGE_LINES = 200     # lines loaded from disk per scroll-up at the top
+BLOCK = 64 * 1024
+
+def read_lines_before(f, end, count):
+    # up to `count` lines that finish before byte offset `end`, plus their offsets
+    data, pos = b"", end
+    while pos > 0 and data.count(b"\n") <= count:
+        step = min(BLOCK, pos)
+        pos -= step
+        f.seek(pos)
+        data = f.read(step) + data
+    if not data:
+        return [], []
+    lines, offsets, off = data[:-1].split(b"\n"), [], pos
+    for line in lines:
+        offsets.append(off)
+        off += len(line) + 1
+    if pos > 0:
+        # the first piece may start mid-line
+        lines, offsets = lines[1:], offsets[1:]
+    return [l.decode(errors='replace') for l in lines[-count:]], offsets[-count:]
+
+class ChatView:
+    # batched, bounded view over a Text widget, backed by an append-only log on disk
+    def __init__(self, text, log_path):
+        self.text = text
+        self.pending = collections.deque()
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        self.log = open(log_path, 'a+b')
+        self.offsets = collections.deque()  # log offset of every line in the widget
+        text.bind("<MouseWheel>", self._on_wheel, add="+")
+        text.bind("<Button-4>", self._on_wheel, add="+")
+        text.after(FLUSH_MS, self._flush)
+
+    def append(self, msg, persist=True):
+        # safe from any thread, the widget is only touched in _flush
+        self.pending.append((msg, persist))
+
+    def _flush(self):
+        try:
+            if self.pending:
+                self._render()
+        finally:
+            self.text.after(FLUSH_MS, self._flush)
+
+    def _render(self):
+        lines = []
+        self.log.seek(0, os.SEEK_END)
+        while self.pending:
+            msg, persist = self.pending.popleft()
+            line = msg.replace("\n", " ")
+            lines.append(line)
+            # lines replayed from the server are shown but not logged again
+            self.offsets.append(self.log.tell() if persist else None)
+            if persist:
+                self.log.write(line.encode() + b"\n")
+        self.log.flush()
+
+        at_bottom = self.text.yview()[1] >= 0.999
+        self.text.config(state='normal')
+        self.text.insert('end', "\n".join(lines) + "\n")
+        # only trim while following the tail, never under someone reading old history
+        excess = len(self.offsets) - MAX_LINES
+        if at_bottom and excess > 0:
+            self.text.delete('1.0', f'{excess + 1}.0')
+            for _ in range(excess):
+                self.offsets.popleft()
+        if at_bottom:
+            self.text.see('end')
+        self.text.config(state='disabled')
+
+    def _on_wheel(self, event):
+        if getattr(event, "delta", 0) < 0 or self.text.yview()[0] > 0:
+            return
+        self.load_older()
+
+    def load_older(self):
+        top = next((o for o in self.offsets if o is not None), None)
+        if top is None:
+            top = self.log.seek(0, os.SEEK_END)
+        lines, offsets = read_lines_before(self.log, top, PAGE_LINES)
+        if not lines:
+            return
+        self.text.config(state='normal')
+        self.text.insert('1.0', "\n".join(lines) + "\n")
+        self.text.config(state='disabled')
+        self.offsets.extendleft(reversed(offsets))
+        self.text.yview(f"{len(lines) + 1}.0")
@@ -5,12 +5,17 @@ from tkinter import filedialog, messagebox, Toplevel, Label, Button
 import os
 import wave
 import pyaudio
-import tempfile
 import time
 from PIL import Image, ImageTk, ImageGrab
 import cv2
 import numpy as np
-import struct
+from file_transfer import folder_size, send_folder, receive_folder
+from protocol import Connection, ChannelWriter, DATA, DATA_CHUNK
+from ui_dispatch import Dispatcher
+from chat_log import ChatView
+import voice_stream
+from video_pipeline import VideoSender, VideoReceiver
+from screen_delta import TileEncoder, ScreenReceiver
 
 # --- Configuration ---
 DOWNLOAD_DIR = os.path.join(os.path.expanduser("~"), "Downloads", "chat")
@@ -18,7 +23,10 @@ SERVER_IP = '192.168.1.4'  # replace with your server IP
 PORT = 12345
 BUFFER_SIZE = 4096
 VIDEO_FPS = 15
+DISPLAY_FPS = 30
 SCREEN_FPS = 5
+REQUEST_TIMEOUT = 120  # seconds to wait for someone to accept a request
+HISTORY_PAGE = 50
 
 class ClientApp(tk.Tk):
     def __init__(self):
@@ -36,18 +44,21 @@ class ClientApp(tk.Tk):
             messagebox.showerror("Connection Error", f"Cannot connect: {e}")
             self.destroy()
             return
+        self.conn = Connection(self.sock)
+        self.dispatcher = Dispatcher(self, on_error=lambda text: self.add_msg(text))
 
         # State flags
         self.username = None
         self.recording = False
         self.video_streaming = False
         self.screen_streaming = False
+        self.history_before = 0  # oldest server history seq shown so far
 
         # Build UI
         self.build_login()
         self.build_chat()
 
-        # Start listener
+        # Start listener: it only decodes frames, UI work goes through the dispatcher
         threading.Thread(target=self.listen_thread, daemon=True).start()
 
     def build_login(self):
@@ -66,6 +77,7 @@ class ClientApp(tk.Tk):
         # start hidden until login
         self.chat_log = tk.Text(self.chat_frame, state='disabled', bg="#333", fg="white")
         self.chat_log.pack(expand=True, fill='both')
+        self.chat_view = ChatView(self.chat_log, os.path.join(DOWNLOAD_DIR, "chat_history.log"))
 
         self.msg_entry = tk.Entry(self.chat_frame, bg="#444", fg="white")
         self.msg_entry.pack(fill='x', pady=5)
@@ -93,15 +105,17 @@ class ClientApp(tk.Tk):
         if not user or not pwd:
             messagebox.showwarning("Input error", "Please enter username and password")
             return
-        # send login
-        self.sock.send(f"LOGIN::{user}::{pwd}".encode())
-        resp = self.sock.recv(1024).decode()
-        if resp.startswith("MSG::Server::") and "joined" in resp:
-            self.username = user
+        # send login, the listener reports the answer through _login_result
+        self.pending_user = user
+        self.conn.send_ctrl(f"LOGIN::{user}::{pwd}")
+
+    def _login_result(self, resp):
+        if resp == "OK":
+            self.username = self.pending_user
             self.login_frame.pack_forget()
             self.chat_frame.pack(expand=True, fill='both')
             self.set_online(True)
-            self.add_msg(f"Logged in as {user}")
+            self.add_msg(f"Logged in as {self.username}")
         else:
             messagebox.showerror("Login Failed", resp)
 
@@ -110,45 +124,60 @@ class ClientApp(tk.Tk):
         self.online_flag.itemconfig(self.flag, fill=color)
 
     def add_msg(self, msg):
-        self.chat_log.config(state='normal')
-        self.chat_log.insert('end', msg + "\n")
-        self.chat_log.see('end')
-        self.chat_log.config(state='disabled')
+        # safe from any thread, ChatView inserts in batches on the Tk loop
+        self.chat_view.append(msg)
 
     def send_msg(self, event=None):
         text = self.msg_entry.get().strip()
-        if text:
-            self.sock.send(f"MSG::{self.username}::{text}".encode())
+        if text.startswith("/search "):
+            self.conn.send_ctrl(f"SEARCH_REQ::{text[8:]}")
+            self.msg_entry.delete(0, 'end')
+        elif text == "/history":
+            # older page from the server, continuing where the last one stopped
+            if self.history_before > 0:
+                self.conn.send_ctrl(f"HIST_REQ::{self.history_before}::{HISTORY_PAGE}")
+            else:
+                self.add_msg("No older history")
+            self.msg_entry.delete(0, 'end')
+        elif text:
+            self.conn.send_ctrl(f"MSG::{self.username}::{text}")
             self.add_msg(f"You: {text}")
             self.msg_entry.delete(0, 'end')
 
+    def _request(self, typ, info=""):
+        # ask peers on a fresh channel; returns the channel once someone accepts
+        chan = self.conn.new_channel()
+        self.conn.send_ctrl(f"{typ}_REQ::{chan}" + (f"::{info}" if info else ""))
+        reply = self.conn.wait_reply(chan, timeout=REQUEST_TIMEOUT)
+        if reply != "ACCEPT":
+            self.add_msg(f"{typ.capitalize()} denied" if reply else f"{typ.capitalize()} request timed out")
+            return None
+        return chan
+
     def offer_transfer(self, typ):
         path = filedialog.askopenfilename() if typ == 'FILE' else filedialog.askdirectory()
         if not path:
             return
-        name = os.path.basename(path)
-        size = os.path.getsize(path)
-        # request
-        self.sock.send(f"{typ}_REQ::{name}::{size}".encode())
-        resp = self.sock.recv(1024).decode()
-        if resp != f"{typ}_ACCEPT":
-            self.add_msg(f"{typ} transfer denied")
+        threading.Thread(target=self._offer_worker, args=(typ, path), daemon=True).start()
+
+    def _offer_worker(self, typ, path):
+        name = os.path.basename(os.path.normpath(path))
+        size = folder_size(path) if typ == 'FOLDER' else os.path.getsize(path)
+        chan = self._request(typ, f"{size}::{name}")
+        if chan is None:
             return
-        # send data
-        self.sock.send(b"READY")
-        with open(path, 'rb') as f:
-            while chunk := f.read(BUFFER_SIZE):
-                self.sock.sendall(chunk)
+        out = ChannelWriter(self.conn, chan)
+        if typ == 'FOLDER':
+            # folder goes out as a tar stream built while walking the tree
+            send_folder(path, out)
+        else:
+            with open(path, 'rb') as f:
+                while chunk := f.read(DATA_CHUNK):
+                    out.write(chunk)
+            out.close()
         self.add_msg(f"Sent {typ.lower()}: {name}")
 
     def start_voice(self):
-        # request voice
-        self.sock.send(b"VOICE_REQ")
-        resp = self.sock.recv(1024)
-        if resp != b"VOICE_ACCEPT":
-            self.add_msg("Voice denied")
-            return
-        # record
         self.recording = True
         threading.Thread(target=self._voice_thread, daemon=True).start()
 
@@ -156,33 +185,56 @@ class ClientApp(tk.Tk):
         self.recording = False
 
     def _voice_thread(self):
+        # stream ADPCM packets while recording instead of buffering the whole memo
+        chan = self._request('VOICE')
+        if chan is None:
+            self.recording = False
+            return
         self.add_msg("Recording voice...")
-        CH, fmt, ch, rate = 1024, pyaudio.paInt16, 1, 44100
         p = pyaudio.PyAudio()
-        stream = p.open(format=fmt, channels=ch, rate=rate, input=True, frames_per_buffer=CH)
-        frames = []
-        while self.recording:
-            frames.append(stream.read(CH))
+        stream = p.open(format=pyaudio.paInt16, channels=voice_stream.CHANNELS,
+                        rate=voice_stream.RATE, input=True,
+                        frames_per_buffer=voice_stream.CHUNK_FRAMES)
+        encoder = voice_stream.AdpcmEncoder()
+        out = ChannelWriter(self.conn, chan)
+        try:
+            while self.recording:
+                out.write(encoder.encode(stream.read(voice_stream.CHUNK_FRAMES)))
+        finally:
+            stream.stop_stream(); stream.close(); p.terminate()
+            out.close()
+        self.add_msg("Voice sent")
+
+    def _receive_voice_stream(self, reader):
+        # feed the jitter buffer as packets arrive and keep a WAV copy on disk
+        jitter = voice_stream.JitterBuffer()
+        player = threading.Thread(target=self._play_stream, args=(jitter,), daemon=True)
+        player.start()
+        path = os.path.join(DOWNLOAD_DIR, f"voice_{int(time.time())}.wav")
+        wf = wave.open(path, 'wb')
+        wf.setnchannels(voice_stream.CHANNELS)
+        wf.setsampwidth(voice_stream.SAMPLE_WIDTH)
+        wf.setframerate(voice_stream.RATE)
+        try:
+            while (packet := reader.recv_frame()) is not None:
+                _, pcm = voice_stream.decode_packet(packet)
+                jitter.put(pcm)
+                wf.writeframes(pcm)
+        finally:
+            jitter.close()
+            wf.close()
+        self.add_msg(f"Received voice message: {os.path.basename(path)}")
+
+    def _play_stream(self, jitter):
+        p = pyaudio.PyAudio()
+        stream = p.open(format=pyaudio.paInt16, channels=voice_stream.CHANNELS,
+                        rate=voice_stream.RATE, output=True,
+                        frames_per_buffer=voice_stream.CHUNK_FRAMES)
+        while (pcm := jitter.get(timeout=1.0)) is not None:
+            stream.write(pcm)
         stream.stop_stream(); stream.close(); p.terminate()
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-        wf = wave.open(tmp.name, 'wb')
-        wf.setnchannels(ch); wf.setsampwidth(p.get_sample_size(fmt)); wf.setframerate(rate)
-        wf.writeframes(b''.join(frames)); wf.close()
-        self.add_msg("Sending voice...")
-        # send as file
-        self.sock.send(f"VOICE_DATA::{os.path.basename(tmp.name)}::{os.path.getsize(tmp.name)}".encode())
-        self.sock.recv(1024)
-        with open(tmp.name, 'rb') as f:
-            while chunk := f.read(BUFFER_SIZE):
-                self.sock.sendall(chunk)
-        os.unlink(tmp.name)
 
     def request_video(self):
-        self.sock.send(b"VIDEO_REQ")
-        resp = self.sock.recv(1024)
-        if resp != b"VIDEO_ACCEPT":
-            self.add_msg("Video denied")
-            return
         self.video_streaming = True
         threading.Thread(target=self._video_thread, daemon=True).start()
 
@@ -190,23 +242,27 @@ class ClientApp(tk.Tk):
         self.video_streaming = False
 
     def _video_thread(self):
+        chan = self._request('VIDEO')
+        if chan is None:
+            self.video_streaming = False
+            return
         cap = cv2.VideoCapture(0)
-        self.sock.send(b"VIDEO_START")
-        while self.video_streaming:
-            ret, frame = cap.read()
-            if not ret: break
-            data = cv2.imencode('.jpg', frame)[1].tobytes()
-            self.sock.send(struct.pack('!I', len(data)) + data)
-            time.sleep(1/VIDEO_FPS)
+        out = ChannelWriter(self.conn, chan)
+        sender = VideoSender(cap, out.write, VIDEO_FPS)
+        sender.start()
+        while self.video_streaming and sender.running:
+            time.sleep(0.2)
+        sender.stop()
+        sender.join()
         cap.release()
-        self.sock.send(b"VIDEO_END")
+        if sender.error is not None:
+            self.add_msg(f"Video stopped: {sender.error}")
+            return
+        out.close()
+        self.add_msg(f"Video ended: {sender.stats.summary()}, quality {sender.quality}, "
+                     f"scale {sender.scale:.1f}, {sender.raw.dropped} frames skipped")
 
     def request_screen(self):
-        self.sock.send(b"SCREEN_REQ")
-        resp = self.sock.recv(1024)
-        if resp != b"SCREEN_ACCEPT":
-            self.add_msg("Screen denied")
-            return
         self.screen_streaming = True
         threading.Thread(target=self._screen_thread, daemon=True).start()
 
@@ -214,72 +270,99 @@ class ClientApp(tk.Tk):
         self.screen_streaming = False
 
     def _screen_thread(self):
-        self.sock.send(b"SCREEN_START")
+        chan = self._request('SCREEN')
+        if chan is None:
+            self.screen_streaming = False
+            return
+        # only tiles that changed since the last frame go out, plus periodic keyframes
+        encoder = TileEncoder()
+        out = ChannelWriter(self.conn, chan)
         while self.screen_streaming:
+            start = time.time()
             img = ImageGrab.grab()
-            frame = cv2.cvtColor(np.array(img), cv2.COLOR_BGR2RGB)
-            data = cv2.imencode('.jpg', frame)[1].tobytes()
-            self.sock.send(struct.pack('!I', len(data)) + data)
-            time.sleep(1/SCREEN_FPS)
-        self.sock.send(b"SCREEN_END")
+            frame = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+            packet = encoder.encode_frame(frame)
+            if packet is not None:
+                out.write(packet)
+            time.sleep(max(0, 1/SCREEN_FPS - (time.time() - start)))
+        out.close()
 
     def listen_thread(self):
-        while True:
-            data = self.sock.recv(BUFFER_SIZE)
-            if not data:
-                break
-            # text message
-            if data.startswith(b"MSG::"):
-                self.add_msg(data.decode()[5:])
-            # file/folder request
-            elif data.startswith(b"FILE_REQ::") or data.startswith(b"FOLDER_REQ::"):
-                typ, name, size = data.decode().split("::")
-                size = int(size)
-                allow = messagebox.askyesno(f"{typ} Request", f"Accept {name} ({size} bytes)?")
-                self.sock.send(f"{typ}_ACCEPT".encode() if allow else f"{typ}_DENY".encode())
-                if allow:
-                    self.sock.recv(1024)  # READY
-                    path = os.path.join(DOWNLOAD_DIR, name)
-                    with open(path, 'wb') as f:
-                        rec = 0
-                        while rec < size:
-                            chunk = self.sock.recv(min(BUFFER_SIZE, size-rec))
-                            rec += len(chunk)
-                            f.write(chunk)
-                    self.add_msg(f"Received {typ.lower()}: {name}")
-                    self.preview(path)
-            # voice request
-            elif data == b"VOICE_REQ":
-                allow = messagebox.askyesno("Voice Request", "Accept voice message?")
-                self.sock.send(b"VOICE_ACCEPT" if allow else b"VOICE_DENY")
-                if allow:
-                    header = self.sock.recv(BUFFER_SIZE).decode()
-                    _, name, size = header.split("::")
-                    size = int(size)
-                    self.sock.send(b"READY")
-                    path = os.path.join(DOWNLOAD_DIR, name)
-                    with open(path, 'wb') as f:
-                        rec = 0
-                        while rec < size:
-                            chunk = self.sock.recv(min(BUFFER_SIZE, size-rec))
-                            rec += len(chunk)
-                            f.write(chunk)
-                    self.add_msg("Received voice message")
-                    self.play_audio(path)
-            # video request
-            elif data == b"VIDEO_REQ":
-                allow = messagebox.askyesno("Video Request", "Accept video stream?")
-                self.sock.send(b"VIDEO_ACCEPT" if allow else b"VIDEO_DENY")
-                if allow:
-                    self.add_msg("Incoming video...")
-                    threading.Thread(target=self._receive_video, daemon=True).start()
-            # screen request
-            elif data == b"SCREEN_REQ":
-                allow = messagebox.askyesno("Screen Request", "Accept screen share?")
-                self.sock.send(b"SCREEN_ACCEPT" if allow else b"SCREEN_DENY")
-                if allow:
-                    self.add_msg("Incoming screen...")
-                    threading.Thread(target=self._receive_screen, daemon=True).start()
+        # network thread: decode frames and hand them off, never touches Tk or the disk
+        try:
+            while True:
+                kind, chan, payload = self.conn.read_frame()
+                if kind == DATA:
+                    self.conn.deliver_data(chan, payload)
+                    continue
+                cmd, _, rest = payload.decode(errors='ignore').partition("::")
+                if cmd in ("OK", "FAIL"):
+                    self.dispatcher.post(self._login_result, cmd)
+                elif cmd == "MSG":
+                    self.add_msg(rest)
+                elif cmd in ("HIST", "FOUND"):
+                    _, ts, line = rest.split("::", 2)
+                    stamp = time.strftime('%m-%d %H:%M', time.localtime(float(ts)))
+                    prefix = "[found] " if cmd == "FOUND" else ""
+                    self.chat_view.append(f"{prefix}[{stamp}] {line}", persist=False)
+                elif cmd == "HIST_END":
+                    self.history_before = int(rest)
+                elif cmd == "FOUND_END":
+                    self.add_msg("Search finished")
+                elif cmd.endswith("_ACCEPT") or cmd.endswith("_DENY"):
+                    self.conn.deliver_reply(int(rest), cmd.rsplit("_", 1)[1])
+                elif cmd.endswith("_REQ"):
+                    self.dispatcher.post(self._on_request, cmd[:-len("_REQ")], rest)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.conn.close_readers()
+            self.dispatcher.post(self.set_online, False)
+
+    def _on_request(self, typ, rest):
+        # runs on the Tk loop; accepted transfers get their own worker thread
+        chan, _, info = rest.partition("::")
+        chan = int(chan)
+        if typ in ('FILE', 'FOLDER'):
+            size, _, name = info.partition("::")
+            name = os.path.basename(name)
+            allow = messagebox.askyesno(f"{typ} Request", f"Accept {name} ({size} bytes)?")
+            target = self._receive_file if typ == 'FILE' else self._receive_folder
+            args = (name, int(size))
+        elif typ in ('VOICE', 'VIDEO', 'SCREEN'):
+            prompts = {'VOICE': ("Voice Request", "Accept voice message?"),
+                       'VIDEO': ("Video Request", "Accept video stream?"),
+                       'SCREEN': ("Screen Request", "Accept screen share?")}
+            allow = messagebox.askyesno(*prompts[typ])
+            target = {'VOICE': self._receive_voice_stream, 'VIDEO': self._receive_video,
+                      'SCREEN': self._receive_screen}[typ]
+            args = ()
+        else:
+            return
+        if not allow:
+            self.conn.send_ctrl(f"{typ}_DENY::{chan}")
+            return
+        # register the channel before accepting so no data frame is lost
+        reader = self.conn.open_reader(chan)
+        self.conn.send_ctrl(f"{typ}_ACCEPT::{chan}")
+        threading.Thread(target=target, args=(reader,) + args, daemon=True).start()
+
+    def _receive_file(self, reader, name, size):
+        path = os.path.join(DOWNLOAD_DIR, name)
+        rec = 0
+        with open(path, 'wb') as f:
+            while (chunk := reader.recv_frame()) is not None:
+                f.write(chunk)
+                rec += len(chunk)
+        if rec != size:
+            self.add_msg(f"Incomplete file: {name} ({rec}/{size} bytes)")
+            return
+        self.add_msg(f"Received file: {name}")
+        self.dispatcher.post(self.preview, path)
+
+    def _receive_folder(self, reader, name, size):
+        count = receive_folder(reader, DOWNLOAD_DIR)
+        self.add_msg(f"Received folder: {name} ({count} files)")
 
     def preview(self, path):
         ext = os.path.splitext(path)[1].lower()
@@ -311,13 +394,48 @@ class ClientApp(tk.Tk):
             data = wf.readframes(CHUNK)
         stream.stop_stream(); stream.close(); p.terminate()
 
-    def _receive_video(self):
-        # implement receive video logic here
-        pass
+    def _receive_video(self, reader):
+        # worker: read frames off the channel, decoding happens on the receiver's own thread
+        receiver = VideoReceiver()
+        self.dispatcher.post(self._show_video, receiver, "Video")
+        try:
+            while (packet := reader.recv_frame()) is not None:
+                receiver.feed(packet)
+        finally:
+            receiver.close()
+        self.add_msg(f"Video ended: {receiver.stats.summary()}")
+
+    def _show_video(self, receiver, title):
+        win = Toplevel(self)
+        win.title(title)
+        lbl = Label(win)
+        lbl.pack()
+        info = Label(win, text="", fg="white", bg="#222")
+        info.pack(fill='x')
 
-    def _receive_screen(self):
-        # implement receive screen logic here
-        pass
+        def render():
+            if not receiver.running or not win.winfo_exists():
+                if win.winfo_exists():
+                    win.destroy()
+                return
+            img = receiver.latest()
+            if img is not None:
+                tkimg = ImageTk.PhotoImage(img)
+                lbl.config(image=tkimg)
+                lbl.image = tkimg
+                info.config(text=receiver.stats.summary())
+            win.after(1000 // DISPLAY_FPS, render)
+        render()
+
+    def _receive_screen(self, reader):
+        receiver = ScreenReceiver()
+        self.dispatcher.post(self._show_video, receiver, "Screen")
+        try:
+            while (packet := reader.recv_frame()) is not None:
+                receiver.feed(packet)
+        finally:
+            receiver.close()
+        self.add_msg(f"Screen share ended: {receiver.stats.summary()}")
 
 if __name__ == '__main__':
     app = ClientApp()
@@ -1,10 +1,144 @@
 import os
+import io
+import tarfile
+import zlib
+
+# zstd is optional, gzip (zlib) is always there
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 DOWNLOAD_DIR = os.path.join(os.path.expanduser("~"), "Downloads", "chat")
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+CHUNK_SIZE = 64 * 1024
+# files above this are always sent raw so memory use never depends on the tree
+COMPRESS_LIMIT = 8 * 1024 * 1024
+# already compressed formats, squeezing them again only burns CPU
+NO_COMPRESS_EXTS = frozenset([
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.avi', '.mov',
+    '.aac', '.ogg', '.flac', '.zip', '.rar', '.7z', '.gz', '.bz2', '.xz', '.zst',
+    '.docx', '.xlsx', '.pptx', '.pdf', '.exe', '.msi',
+])
+CODEC_KEY = "NRN.codec"
+
 def save_file(filename, data):
     path = os.path.join(DOWNLOAD_DIR, filename)
     with open(path, "wb") as f:
         f.write(data)
     return path
+
+def walk_tree(root):
+    # iterative scandir walk, yields (DirEntry, path relative to root)
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel)) as it:
+                for entry in it:
+                    entry_rel = os.path.join(rel, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry_rel)
+                    yield entry, entry_rel
+        except OSError:
+            continue
+
+def folder_size(root):
+    total = 0
+    for entry, _ in walk_tree(root):
+        if entry.is_file(follow_symlinks=False):
+            try:
+                total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+    return total
+
+def pick_codec(name, size):
+    ext = os.path.splitext(name)[1].lower()
+    if size < 512 or size > COMPRESS_LIMIT or ext in NO_COMPRESS_EXTS:
+        return None
+    return "zstd" if zstandard is not None else "gzip"
+
+def _compress(path, codec):
+    with open(path, 'rb') as f:
+        if codec == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(f.read())
+        comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 -> gzip container
+        out = bytearray()
+        while chunk := f.read(CHUNK_SIZE):
+            out += comp.compress(chunk)
+        out += comp.flush()
+        return bytes(out)
+
+def send_folder(root, fileobj):
+    # stream the tree as a tar archive straight into fileobj, no temp file
+    base = os.path.basename(os.path.normpath(root))
+    with tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT,
+                      bufsize=CHUNK_SIZE) as tar:
+        for entry, rel in walk_tree(root):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            info = tarfile.TarInfo(os.path.join(base, rel).replace(os.sep, '/'))
+            info.mtime = st.st_mtime
+            info.mode = st.st_mode & 0o777
+            if entry.is_dir(follow_symlinks=False):
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            elif entry.is_file(follow_symlinks=False):
+                codec = pick_codec(entry.name, st.st_size)
+                try:
+                    if codec:
+                        data = _compress(entry.path, codec)
+                        if len(data) < st.st_size:
+                            info.size = len(data)
+                            info.pax_headers = {CODEC_KEY: codec}
+                            tar.addfile(info, io.BytesIO(data))
+                            continue
+                    with open(entry.path, 'rb') as f:
+                        info.size = st.st_size
+                        tar.addfile(info, f)
+                except OSError:
+                    continue
+    fileobj.close()
+
+def _safe_join(dest, name):
+    path = os.path.realpath(os.path.join(dest, name))
+    if os.path.commonpath([path, os.path.realpath(dest)]) != os.path.realpath(dest):
+        raise ValueError(f"unsafe path in archive: {name}")
+    return path
+
+def _decompressor(codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is needed to receive this folder")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(31)
+
+def receive_folder(fileobj, dest):
+    # extract members as they arrive; returns the number of files written
+    os.makedirs(dest, exist_ok=True)
+    count = 0
+    with tarfile.open(fileobj=fileobj, mode='r|', bufsize=CHUNK_SIZE) as tar:
+        for member in tar:
+            path = _safe_join(dest, member.name)
+            if member.isdir():
+                os.makedirs(path, exist_ok=True)
+                continue
+            if not member.isfile():
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            codec = member.pax_headers.get(CODEC_KEY)
+            dec = _decompressor(codec) if codec else None
+            src = tar.extractfile(member)
+            with open(path, 'wb') as f:
+                while chunk := src.read(CHUNK_SIZE):
+                    f.write(dec.decompress(chunk) if dec else chunk)
+                if dec and hasattr(dec, "flush"):
+                    f.write(dec.flush())
+            count += 1
+    if hasattr(fileobj, "drain"):
+        fileobj.drain()
+    return count
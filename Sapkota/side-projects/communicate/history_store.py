@@ -0,0 +1,128 @@
+import os
+import re
+import queue
+import struct
+import threading
+import time
+from array import array
+
+# record: payload length, timestamp, then "user::text" in utf-8
+RECORD = struct.Struct('!Id')
+SEGMENT_BYTES = 16 * 1024 * 1024
+FSYNC_INTERVAL = 0.5   # seconds; one fsync covers every record written in that window
+TOKEN = re.compile(r"\w+")
+
+def tokens(text):
+    return set(TOKEN.findall(text.lower()))
+
+class HistoryStore:
+    # append-only chat log split into segment files, with an offset index and a word index
+    def __init__(self, directory):
+        self.dir = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.segments = array('I')   # seq -> segment number
+        self.offsets = array('Q')    # seq -> byte offset inside that segment
+        self.words = {}              # word -> array of seqs, ascending
+        self.queue = queue.Queue()
+        self.current = 0
+        self._load()
+        self.out = open(self._path(self.current), 'ab')
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    def _path(self, segment):
+        return os.path.join(self.dir, f"segment-{segment:06d}.log")
+
+    def _load(self):
+        # rebuild both indexes from the segments on disk
+        numbers = sorted(int(n[8:14]) for n in os.listdir(self.dir)
+                         if n.startswith("segment-") and n.endswith(".log"))
+        for segment in numbers:
+            self.current = segment
+            with open(self._path(segment), 'rb') as f:
+                offset = 0
+                while head := f.read(RECORD.size):
+                    if len(head) < RECORD.size:
+                        break
+                    size, _ = RECORD.unpack(head)
+                    payload = f.read(size)
+                    if len(payload) < size:
+                        break  # torn write at the tail, ignore it
+                    self._index(segment, offset, payload.decode(errors='replace'))
+                    offset += RECORD.size + size
+
+    def _index(self, segment, offset, payload):
+        seq = len(self.offsets)
+        self.segments.append(segment)
+        self.offsets.append(offset)
+        for word in tokens(payload.partition("::")[2]):
+            self.words.setdefault(word, array('I')).append(seq)
+
+    def append(self, user, text):
+        # never blocks the broadcast path; the writer thread does the I/O
+        self.queue.put((time.time(), f"{user}::{text}"))
+
+    def _writer(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.time() + FSYNC_INTERVAL
+            while (left := deadline - time.time()) > 0:
+                try:
+                    batch.append(self.queue.get(timeout=left))
+                except queue.Empty:
+                    break
+            placed = []
+            for ts, payload in batch:
+                if self.out.tell() >= SEGMENT_BYTES:
+                    self.out.close()
+                    self.current += 1
+                    self.out = open(self._path(self.current), 'ab')
+                data = payload.encode()
+                placed.append((self.current, self.out.tell(), payload))
+                self.out.write(RECORD.pack(len(data), ts) + data)
+            self.out.flush()
+            os.fsync(self.out.fileno())
+            # records become visible to readers only once they are durable
+            with self.lock:
+                for segment, offset, payload in placed:
+                    self._index(segment, offset, payload)
+
+    def count(self):
+        with self.lock:
+            return len(self.offsets)
+
+    def read(self, seqs):
+        # [(seq, timestamp, "user::text")] for the given sequence numbers
+        out, handles = [], {}
+        try:
+            for seq in seqs:
+                with self.lock:
+                    segment, offset = self.segments[seq], self.offsets[seq]
+                f = handles.get(segment) or handles.setdefault(segment, open(self._path(segment), 'rb'))
+                f.seek(offset)
+                size, ts = RECORD.unpack(f.read(RECORD.size))
+                out.append((seq, ts, f.read(size).decode(errors='replace')))
+        finally:
+            for f in handles.values():
+                f.close()
+        return out
+
+    def page(self, before=None, limit=50):
+        # up to `limit` messages older than seq `before` (newest page when None), oldest first
+        end = self.count() if before is None else min(before, self.count())
+        return self.read(range(max(0, end - limit), end))
+
+    def search(self, query, limit=50):
+        # newest messages containing every word of the query
+        words = tokens(query)
+        if not words:
+            return []
+        with self.lock:
+            postings = [self.words.get(w) for w in words]
+            if any(p is None for p in postings):
+                return []
+            postings.sort(key=len)
+            hits = set(postings[0])
+            for p in postings[1:]:
+                hits.intersection_update(p)
+        return self.read(sorted(hits)[-limit:])
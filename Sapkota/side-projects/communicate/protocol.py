@@ -0,0 +1,160 @@
+import queue
+import random
+import struct
+import threading
+
+# every message on the wire is one frame: kind, channel, payload length, payload
+# CTRL frames carry the text commands ("MSG::...", "FILE_REQ::..."), DATA frames
+# carry transfer bytes for a channel and an empty DATA frame closes that channel
+HEADER = struct.Struct('!BII')
+CTRL, DATA = 0, 1
+DATA_CHUNK = 64 * 1024
+# frames a channel may queue before the network thread waits for its worker (~16 MB)
+CHANNEL_BACKLOG = 256
+# seconds the network thread waits on a full channel before cutting that channel off,
+# so one slow transfer cannot hold up chat and every other channel for longer
+CHANNEL_STALL = 2
+
+def recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+def read_frame(sock):
+    kind, chan, size = HEADER.unpack(recv_exact(sock, HEADER.size))
+    return kind, chan, recv_exact(sock, size) if size else b""
+
+def pack_frame(kind, chan, payload):
+    return HEADER.pack(kind, chan, len(payload)) + payload
+
+class ChannelReader:
+    # worker side of a channel: frame at a time, or file-like read() for tarfile
+    def __init__(self):
+        self.frames = queue.Queue(maxsize=CHANNEL_BACKLOG)
+        self.buf = b""
+        self.done = False
+        self.cut = False    # dropped for falling behind; ends once the queued frames are read
+
+    def recv_frame(self):
+        # next payload, None once the sender closed the channel (or it was cut off)
+        if self.done:
+            return None
+        if self.cut and self.frames.empty():
+            self.done = True
+            return None
+        frame = self.frames.get()
+        if frame is None:
+            self.done = True
+        return frame
+
+    def read(self, n=-1):
+        while not self.done and (n < 0 or len(self.buf) < n):
+            frame = self.recv_frame()
+            if frame is not None:
+                self.buf += frame
+        if n < 0:
+            n = len(self.buf)
+        data, self.buf = self.buf[:n], self.buf[n:]
+        return data
+
+    def drain(self):
+        while self.recv_frame() is not None:
+            pass
+
+class ChannelWriter:
+    # file-like sender for one channel; close() sends the end marker
+    def __init__(self, conn, chan):
+        self.conn = conn
+        self.chan = chan
+
+    def write(self, data):
+        data = bytes(data)
+        for i in range(0, len(data), DATA_CHUNK):
+            self.conn.send_data(self.chan, data[i:i + DATA_CHUNK])
+        return len(data)
+
+    def close(self):
+        self.conn.send_data(self.chan, b"")
+
+class Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.channels = {}   # chan -> ChannelReader
+        self.replies = {}    # chan -> queue waiting for ACCEPT/DENY
+
+    def send_ctrl(self, text):
+        self._send(pack_frame(CTRL, 0, text.encode()))
+
+    def send_data(self, chan, data):
+        # one frame per call so chat frames can slip in between transfer chunks
+        self._send(pack_frame(DATA, chan, data))
+
+    def _send(self, frame):
+        with self.send_lock:
+            self.sock.sendall(frame)
+
+    def read_frame(self):
+        return read_frame(self.sock)
+
+    def new_channel(self):
+        # random ids so two peers behind the same relay do not collide
+        with self.lock:
+            while True:
+                chan = random.getrandbits(31) | 1
+                if chan not in self.channels and chan not in self.replies:
+                    self.replies[chan] = queue.Queue(maxsize=1)
+                    return chan
+
+    def wait_reply(self, chan, timeout=None):
+        try:
+            return self.replies[chan].get(timeout=timeout)
+        except queue.Empty:
+            return None
+        finally:
+            with self.lock:
+                self.replies.pop(chan, None)
+
+    def deliver_reply(self, chan, reply):
+        with self.lock:
+            waiter = self.replies.get(chan)
+        if waiter is not None:
+            try:
+                waiter.put_nowait(reply)
+            except queue.Full:
+                pass  # someone else already answered
+
+    def open_reader(self, chan):
+        reader = ChannelReader()
+        with self.lock:
+            self.channels[chan] = reader
+        return reader
+
+    def deliver_data(self, chan, payload):
+        # called by the network thread; frames for channels we did not accept are dropped
+        with self.lock:
+            reader = self.channels.get(chan)
+            if reader is not None and not payload:
+                del self.channels[chan]
+        if reader is None:
+            return
+        try:
+            reader.frames.put(payload or None, timeout=CHANNEL_STALL)
+        except queue.Full:
+            # the worker is too far behind; later frames for it are dropped, the
+            # receiver sees a short transfer
+            with self.lock:
+                if self.channels.get(chan) is reader:
+                    del self.channels[chan]
+            reader.cut = True
+
+    def close_readers(self):
+        with self.lock:
+            readers, self.channels = list(self.channels.values()), {}
+        for reader in readers:
+            reader.frames.put(None)
@@ -0,0 +1,117 @@
+import struct
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from PIL import Image
+from video_pipeline import LatestSlot, Stats
+
+TILE = 64
+KEYFRAME_EVERY = 50   # full frame every N sends so a late joiner or glitch heals
+QUALITY = 75
+
+KEYFRAME, DELTA = 1, 0
+# packet: kind, frame width, frame height, tile size, tile count
+HEADER = struct.Struct('!BHHHH')
+# per tile: column, row, jpeg length
+TILE_HEADER = struct.Struct('!HHI')
+
+def encode_jpeg(arr, quality=QUALITY):
+    return cv2.imencode('.jpg', arr, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+def decode_jpeg(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def dirty_tiles(prev, frame, tile=TILE):
+    # boolean (rows, cols) grid of tiles that differ between two frames
+    h, w = frame.shape[:2]
+    changed = np.any(frame != prev, axis=2)
+    rows, cols = -(-h // tile), -(-w // tile)
+    padded = np.zeros((rows * tile, cols * tile), dtype=bool)
+    padded[:h, :w] = changed
+    return padded.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+
+class TileEncoder:
+    def __init__(self, tile=TILE, keyframe_every=KEYFRAME_EVERY, encode=encode_jpeg):
+        self.tile = tile
+        self.keyframe_every = keyframe_every
+        self.encode = encode
+        self.prev = None
+        self.since_key = 0
+
+    def encode_frame(self, frame):
+        # packet bytes for this frame, or None when nothing changed
+        h, w = frame.shape[:2]
+        if (self.prev is None or self.prev.shape != frame.shape
+                or self.since_key >= self.keyframe_every):
+            self.prev = frame.copy()
+            self.since_key = 0
+            data = self.encode(frame)
+            return HEADER.pack(KEYFRAME, w, h, self.tile, 1) + TILE_HEADER.pack(0, 0, len(data)) + data
+        grid = dirty_tiles(self.prev, frame, self.tile)
+        if not grid.any():
+            return None
+        self.since_key += 1
+        t = self.tile
+        parts = []
+        for row, col in zip(*np.nonzero(grid)):
+            y, x = row * t, col * t
+            data = self.encode(frame[y:y + t, x:x + t])
+            parts.append(TILE_HEADER.pack(col, row, len(data)) + data)
+            self.prev[y:y + t, x:x + t] = frame[y:y + t, x:x + t]
+        return HEADER.pack(DELTA, w, h, t, len(parts)) + b"".join(parts)
+
+class TileDecoder:
+    def __init__(self, decode=decode_jpeg):
+        self.decode = decode
+        self.frame = None
+
+    def apply(self, packet):
+        # composite a packet into the current frame; None until the first keyframe
+        kind, w, h, t, count = HEADER.unpack_from(packet)
+        pos = HEADER.size
+        for _ in range(count):
+            col, row, size = TILE_HEADER.unpack_from(packet, pos)
+            pos += TILE_HEADER.size
+            img = self.decode(packet[pos:pos + size])
+            pos += size
+            if kind == KEYFRAME:
+                self.frame = img
+            elif self.frame is not None and self.frame.shape[:2] == (h, w):
+                y, x = row * t, col * t
+                self.frame[y:y + img.shape[0], x:x + img.shape[1]] = img
+        return self.frame
+
+class ScreenReceiver:
+    # same interface as VideoReceiver; deltas must be applied in order so nothing is dropped here
+    def __init__(self):
+        self.packets = queue.Queue(maxsize=64)
+        self.frames = LatestSlot()
+        self.stats = Stats()
+        self.decoder = TileDecoder()
+        self.running = True
+        threading.Thread(target=self._decode_loop, daemon=True).start()
+
+    def feed(self, packet):
+        self.packets.put((time.time(), packet))
+
+    def close(self):
+        self.running = False
+        self.packets.put(None)
+
+    def _decode_loop(self):
+        while (item := self.packets.get()) is not None:
+            arrived, packet = item
+            frame = self.decoder.apply(packet)
+            if frame is not None:
+                img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                self.frames.put((arrived, img))
+
+    def latest(self):
+        item = self.frames.take()
+        if item is None:
+            return None
+        arrived, img = item
+        self.stats.add(time.time() - arrived)
+        return img
@@ -1,6 +1,9 @@
 import socket
 import threading
+import queue
 import os
+from protocol import read_frame, pack_frame, CTRL, DATA
+from history_store import HistoryStore
 
 HOST = '192.168.1.4'  # listen all interfaces
 PORT = 12345
@@ -8,75 +11,205 @@ users = {
     'sapkota': 'sapkota',
     'admin': 'admin123',
 }
-clients = {}  # username -> client_socket
+clients = {}  # username -> Outbox
+routes = {}   # channel -> [requesting user, accepting user or None]
+history = None  # HistoryStore, opened in main()
+HISTORY_DIR = "history"
+HISTORY_ON_LOGIN = 50
+SEND_BACKLOG = 512     # frames queued per client before it counts as stuck
+DATA_WAIT = 30         # seconds a relayed transfer frame may wait for a slow receiver
 
 lock = threading.Lock()
 
-def broadcast(msg, exclude_user=None):
+class Outbox:
+    # every write to one client goes through here, on that client's own thread,
+    # so a slow receiver only ever holds up itself
+    def __init__(self, sock):
+        self.sock = sock
+        self.queue = queue.Queue(maxsize=SEND_BACKLOG)
+        self.closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def send(self, frame, timeout=None):
+        # chat is never waited for (timeout None); transfer data waits up to timeout.
+        # A client that cannot keep up is disconnected rather than allowed to stall others.
+        if self.closed:
+            return False
+        try:
+            if timeout is None:
+                self.queue.put_nowait(frame)
+            else:
+                self.queue.put(frame, timeout=timeout)
+            return True
+        except queue.Full:
+            self.close()
+            return False
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)  # wakes the reader and a blocked sendall
+        except OSError:
+            pass
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None or self.closed:
+                return
+            try:
+                self.sock.sendall(frame)
+            except OSError:
+                self.close()
+                return
+
+def broadcast(frame, exclude_user=None):
     with lock:
-        for user, sock in clients.items():
-            if user != exclude_user:
-                try:
-                    sock.send(msg)
-                except:
-                    pass
+        targets = [box for user, box in clients.items() if user != exclude_user]
+    for box in targets:
+        box.send(frame)
+
+def relay_data(username, chan, payload):
+    # transfer bytes go only to the other end of the channel, never to everyone
+    with lock:
+        route = routes.get(chan)
+        if route is None or username not in route:
+            return
+        peer = route[1] if route[0] == username else route[0]
+        box = clients.get(peer) if peer else None
+        if not payload:
+            del routes[chan]   # empty frame closes the channel
+    if box is not None:
+        box.send(pack_frame(DATA, chan, payload), timeout=DATA_WAIT)
+
+def track_route(username, cmd, rest):
+    # <TYPE>_REQ::<chan> opens a channel, the first <TYPE>_ACCEPT::<chan> picks its receiver;
+    # returns False for a late ACCEPT, which is not relayed
+    chan = rest.partition("::")[0]
+    if not chan.isdigit():
+        return True
+    chan = int(chan)
+    with lock:
+        if cmd.endswith("_REQ"):
+            routes[chan] = [username, None]
+            return True
+        if not cmd.endswith("_ACCEPT"):
+            return True
+        route = routes.get(chan)
+        if route is not None and route[1] is None and route[0] != username:
+            route[1] = username
+            return True
+        late = clients.get(username)
+    if late is not None:
+        late.send(pack_frame(DATA, chan, b""))  # close the reader it opened, someone else has the channel
+    return False
+
+def server_msg(text):
+    return pack_frame(CTRL, 0, f"MSG::Server::{text}".encode())
+
+def send_records(outbox, tag, records):
+    # one frame per stored message, then an end marker the client pages from
+    frames = [pack_frame(CTRL, 0, f"{tag}::{seq}::{ts:.0f}::{payload}".encode())
+              for seq, ts, payload in records]
+    oldest = records[0][0] if records else 0
+    frames.append(pack_frame(CTRL, 0, f"{tag}_END::{oldest}".encode()))
+    outbox.send(b"".join(frames))  # one queued write, so relayed frames cannot land in between
 
 def handle_client(client_sock, addr):
     print(f"[NEW CONNECTION] {addr}")
     username = None
+    uploads = {}  # channel -> (file, filename) for FILE:: uploads to the server
+    outbox = Outbox(client_sock)
     try:
         while True:
-            data = client_sock.recv(4096)
-            if not data:
-                break
-            text = data.decode(errors='ignore')
+            kind, chan, payload = read_frame(client_sock)
+            if kind == DATA:
+                if chan in uploads:
+                    f, filename = uploads[chan]
+                    if payload:
+                        f.write(payload)
+                    else:
+                        f.close()
+                        del uploads[chan]
+                        print(f"Received file {filename} from {username}")
+                        broadcast(server_msg(f"{username} sent file {filename}"), exclude_user=username)
+                elif username:
+                    # transfer bytes between peers are relayed untouched, to the accepting peer only
+                    relay_data(username, chan, payload)
+                continue
+            text = payload.decode(errors='ignore')
             if text.startswith("LOGIN::"):
                 _, user, pwd = text.split("::", 2)
                 if users.get(user) == pwd:
                     with lock:
-                        clients[user] = client_sock
+                        clients[user] = outbox
                     username = user
-                    client_sock.send(b"OK")
-                    broadcast(f"MSG::Server::{user} joined.".encode())
+                    outbox.send(pack_frame(CTRL, 0, b"OK"))
+                    if history:
+                        send_records(outbox, "HIST", history.page(limit=HISTORY_ON_LOGIN))
+                    broadcast(server_msg(f"{user} joined."), exclude_user=user)
                     print(f"{user} logged in")
                 else:
-                    client_sock.send(b"FAIL")
+                    outbox.send(pack_frame(CTRL, 0, b"FAIL"))
             elif text.startswith("MSG::") and username:
-                # broadcast chat message
-                broadcast(data, exclude_user=username)
+                broadcast(pack_frame(CTRL, 0, payload), exclude_user=username)
+                if history:
+                    history.append(username, text.split("::", 2)[-1])
+            elif text.startswith("HIST_REQ::") and username and history:
+                # HIST_REQ::<before seq>::<count>; a malformed one is answered, not fatal
+                try:
+                    _, before, count = text.split("::")
+                    before, count = int(before), int(count)
+                except ValueError:
+                    outbox.send(server_msg("Bad history request"))
+                    continue
+                send_records(outbox, "HIST", history.page(before, max(0, min(count, 500))))
+            elif text.startswith("SEARCH_REQ::") and username and history:
+                send_records(outbox, "FOUND", history.search(text.split("::", 1)[1]))
             elif text.startswith("FILE::") and username:
-                # Header: FILE::<filename>::<filesize>
-                _, filename, filesize = text.split("::")
-                filesize = int(filesize)
-                client_sock.send(b"READY")  # acknowledge to send file data
-
-                # receive file bytes
-                received = 0
-                with open(os.path.join("downloads", filename), "wb") as f:
-                    while received < filesize:
-                        chunk = client_sock.recv(min(4096, filesize - received))
-                        if not chunk:
-                            break
-                        f.write(chunk)
-                        received += len(chunk)
-                print(f"Received file {filename} from {username}")
-                broadcast(f"MSG::Server::{username} sent file {filename}".encode(), exclude_user=username)
+                # Header: FILE::<channel>::<filename>, data follows on that channel
+                try:
+                    _, up_chan, filename = text.split("::", 2)
+                    up_chan = int(up_chan)
+                except ValueError:
+                    outbox.send(server_msg("Bad file header"))
+                    continue
+                filename = os.path.basename(filename)
+                uploads[up_chan] = (open(os.path.join("downloads", filename), "wb"), filename)
+            elif username:
+                # chat and every request/answer between peers is relayed as-is
+                cmd, _, rest = text.partition("::")
+                if cmd.endswith(("_REQ", "_ACCEPT", "_DENY")) and not track_route(username, cmd, rest):
+                    continue
+                broadcast(pack_frame(CTRL, 0, payload), exclude_user=username)
             else:
-                # unknown or not logged in message
-                client_sock.send(b"ERR")
+                # not logged in
+                outbox.send(pack_frame(CTRL, 0, b"ERR"))
     except Exception as e:
         print(f"Error with client {addr}: {e}")
     finally:
+        for f, _ in uploads.values():
+            f.close()
+        outbox.close()
         client_sock.close()
         if username:
             with lock:
-                clients.pop(username, None)
-            broadcast(f"MSG::Server::{username} left.".encode())
+                if clients.get(username) is outbox:
+                    clients.pop(username, None)
+                for chan in [c for c, route in routes.items() if username in route]:
+                    del routes[chan]
+            broadcast(server_msg(f"{username} left."))
             print(f"{username} disconnected")
 
 def main():
+    global history
     if not os.path.exists("downloads"):
         os.mkdir("downloads")
+    history = HistoryStore(HISTORY_DIR)
 
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.bind((HOST, PORT))
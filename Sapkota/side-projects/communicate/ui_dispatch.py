@@ -0,0 +1,38 @@
+import queue
+import logging
+
+DRAIN_MS = 15
+MAX_EVENTS_PER_TICK = 500
+
+log = logging.getLogger(__name__)
+
+class Dispatcher:
+    # background threads post callables here; only the Tk loop runs them
+    def __init__(self, root, on_error=None):
+        self.root = root
+        self.on_error = on_error   # on_error(text) shows a failed event to the user
+        self.events = queue.SimpleQueue()
+        self.root.after(DRAIN_MS, self._drain)
+
+    def post(self, fn, *args):
+        self.events.put((fn, args))
+
+    def _drain(self):
+        # bounded per tick so a flood of events cannot freeze the window
+        try:
+            for _ in range(MAX_EVENTS_PER_TICK):
+                try:
+                    fn, args = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    fn(*args)
+                except Exception as e:
+                    log.exception("UI event %s failed", getattr(fn, "__name__", fn))
+                    if self.on_error is not None:
+                        try:
+                            self.on_error(f"UI error: {e}")
+                        except Exception:
+                            log.exception("could not report UI error")
+        finally:
+            self.root.after(DRAIN_MS, self._drain)
@@ -0,0 +1,188 @@
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from PIL import Image
+
+# frame header: capture timestamp, width, height, jpeg quality
+HEADER = struct.Struct('!dHHB')
+MIN_QUALITY, MAX_QUALITY = 30, 85
+MIN_SCALE, MAX_SCALE = 0.4, 1.0
+
+class LatestSlot:
+    # one-item queue that keeps only the newest value; stale frames are dropped, never queued
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.item = None
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if self.item is not None:
+                self.dropped += 1
+            self.item = item
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        with self.cond:
+            while self.item is None and not self.closed:
+                if not self.cond.wait(timeout):
+                    return None
+            item, self.item = self.item, None
+            return item
+
+    def take(self):
+        # non-blocking get for the Tk side
+        with self.cond:
+            item, self.item = self.item, None
+            return item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+class Stats:
+    # frames per second and a smoothed latency, in ms
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.frames = 0
+        self.latency = 0.0
+
+    def add(self, latency):
+        with self.lock:
+            self.frames += 1
+            ms = latency * 1000
+            self.latency = ms if self.frames == 1 else self.latency * 0.9 + ms * 0.1
+
+    def fps(self):
+        return self.frames / max(time.time() - self.started, 1e-6)
+
+    def summary(self):
+        return f"{self.fps():.1f} fps, {self.latency:.0f} ms"
+
+class VideoSender:
+    # capture -> encode -> send, each on its own thread, linked by LatestSlots
+    def __init__(self, capture, write, fps):
+        self.capture = capture
+        self.write = write
+        self.interval = 1.0 / fps
+        self.running = True
+        self.quality = 70
+        self.scale = 1.0
+        self.raw = LatestSlot()
+        self.encoded = LatestSlot()
+        self.stats = Stats()
+        self.error = None   # set when the link failed and the pipeline stopped itself
+
+    def start(self):
+        self.threads = [threading.Thread(target=t, daemon=True)
+                        for t in (self._capture_loop, self._encode_loop, self._send_loop)]
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        self.running = False
+        self.raw.close()
+        self.encoded.close()
+
+    def join(self):
+        for t in self.threads:
+            t.join()
+
+    def _capture_loop(self):
+        next_at = time.time()
+        while self.running:
+            ret, frame = self.capture.read()
+            if not ret:
+                break
+            self.raw.put((time.time(), frame))
+            # pace to the target rate without drifting when reads are slow
+            next_at = max(next_at + self.interval, time.time())
+            time.sleep(max(0, next_at - time.time()))
+        self.stop()
+
+    def _encode_loop(self):
+        while self.running:
+            item = self.raw.get(timeout=0.5)
+            if item is None:
+                continue
+            ts, frame = item
+            if self.scale < 1.0:
+                frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale,
+                                   interpolation=cv2.INTER_AREA)
+            h, w = frame.shape[:2]
+            q = int(self.quality)
+            ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, q])
+            if ok:
+                self.encoded.put(HEADER.pack(ts, w, h, q) + buf.tobytes())
+
+    def _send_loop(self):
+        while self.running:
+            packet = self.encoded.get(timeout=0.5)
+            if packet is None:
+                continue
+            start = time.time()
+            try:
+                self.write(packet)
+            except (OSError, ConnectionError) as e:
+                # the link is gone: stop every stage so the owner sees running go False
+                self.error = e
+                self.stop()
+                return
+            sent = time.time()
+            self.stats.add(sent - HEADER.unpack_from(packet)[0])
+            self._adapt(sent - start)
+
+    def _adapt(self, send_time):
+        # shed quality first, then resolution, when the link cannot keep up; recover slowly
+        if send_time > self.interval * 0.8:
+            if self.quality > MIN_QUALITY:
+                self.quality = max(MIN_QUALITY, self.quality - 5)
+            else:
+                self.scale = max(MIN_SCALE, self.scale - 0.1)
+        elif send_time < self.interval * 0.3:
+            if self.scale < MAX_SCALE:
+                self.scale = min(MAX_SCALE, self.scale + 0.02)
+            else:
+                self.quality = min(MAX_QUALITY, self.quality + 1)
+
+class VideoReceiver:
+    # network thread feeds packets, a worker decodes, Tk pulls the newest image at display rate
+    def __init__(self):
+        self.packets = LatestSlot()
+        self.frames = LatestSlot()
+        self.stats = Stats()
+        self.running = True
+        threading.Thread(target=self._decode_loop, daemon=True).start()
+
+    def feed(self, packet):
+        self.packets.put((time.time(), packet))
+
+    def close(self):
+        self.running = False
+        self.packets.close()
+
+    def _decode_loop(self):
+        while self.running:
+            item = self.packets.get(timeout=0.5)
+            if item is None:
+                continue
+            arrived, packet = item
+            data = np.frombuffer(packet, dtype=np.uint8, offset=HEADER.size)
+            frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if frame is not None:
+                img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                self.frames.put((arrived, img))
+
+    def latest(self):
+        # called from the Tk loop; returns a PIL image or None
+        item = self.frames.take()
+        if item is None:
+            return None
+        arrived, img = item
+        self.stats.add(time.time() - arrived)
+        return img
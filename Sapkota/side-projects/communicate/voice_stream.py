@@ -0,0 +1,148 @@
+import struct
+import threading
+import collections
+import warnings
+
+# audioop is the fast path for IMA ADPCM; it is gone in Python 3.13 so keep a fallback
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+RATE = 16000          # voice does not need 44.1 kHz
+CHANNELS = 1
+SAMPLE_WIDTH = 2      # paInt16
+CHUNK_FRAMES = 320    # 20 ms per packet
+PREFILL = 4           # packets buffered before playback starts (~80 ms)
+MAX_BUFFERED = 25     # ~500 ms, older packets are dropped past this
+
+# packet header: sequence number plus the ADPCM state needed to decode it on its own
+HEADER = struct.Struct('!IhB')
+
+_STEPS = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+]
+_INDEX = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8]
+
+def _clamp(v, lo, hi):
+    return lo if v < lo else hi if v > hi else v
+
+def _decode_nibble(code, valpred, index):
+    step = _STEPS[index]
+    diff = step >> 3
+    if code & 4: diff += step
+    if code & 2: diff += step >> 1
+    if code & 1: diff += step >> 2
+    valpred = _clamp(valpred - diff if code & 8 else valpred + diff, -32768, 32767)
+    return valpred, _clamp(index + _INDEX[code], 0, 88)
+
+def _lin2adpcm(pcm, state):
+    # same bit layout as audioop.lin2adpcm (first sample in the high nibble)
+    valpred, index = state or (0, 0)
+    samples = struct.unpack(f'<{len(pcm) // 2}h', pcm)
+    out = bytearray()
+    high = None
+    for s in samples:
+        step = _STEPS[index]
+        diff = s - valpred
+        code = 0
+        if diff < 0:
+            code = 8
+            diff = -diff
+        if diff >= step:
+            code |= 4; diff -= step
+        if diff >= step >> 1:
+            code |= 2; diff -= step >> 1
+        if diff >= step >> 2:
+            code |= 1
+        valpred, index = _decode_nibble(code, valpred, index)
+        if high is None:
+            high = code << 4
+        else:
+            out.append(high | code)
+            high = None
+    if high is not None:
+        out.append(high)
+    return bytes(out), (valpred, index)
+
+def _adpcm2lin(data, state):
+    valpred, index = state or (0, 0)
+    out = []
+    for byte in data:
+        for code in (byte >> 4, byte & 0x0f):
+            valpred, index = _decode_nibble(code, valpred, index)
+            out.append(valpred)
+    return struct.pack(f'<{len(out)}h', *out), (valpred, index)
+
+class AdpcmEncoder:
+    def __init__(self):
+        self.state = None
+        self.seq = 0
+
+    def encode(self, pcm):
+        valpred, index = self.state or (0, 0)
+        if audioop is not None:
+            data, self.state = audioop.lin2adpcm(pcm, SAMPLE_WIDTH, self.state)
+        else:
+            data, self.state = _lin2adpcm(pcm, self.state)
+        packet = HEADER.pack(self.seq, valpred, index) + data
+        self.seq += 1
+        return packet
+
+def decode_packet(packet):
+    # every packet carries its own start state, so dropped packets never desync the decoder
+    seq, valpred, index = HEADER.unpack_from(packet)
+    data = packet[HEADER.size:]
+    if audioop is not None:
+        pcm, _ = audioop.adpcm2lin(data, SAMPLE_WIDTH, (valpred, index))
+    else:
+        pcm, _ = _adpcm2lin(data, (valpred, index))
+    return seq, pcm
+
+class JitterBuffer:
+    # bounded playout buffer: waits for PREFILL packets, drops the oldest when full
+    def __init__(self, prefill=PREFILL, max_packets=MAX_BUFFERED):
+        self.prefill = prefill
+        self.packets = collections.deque(maxlen=max_packets)
+        self.cond = threading.Condition()
+        self.buffering = True
+        self.closed = False
+        self.dropped = 0
+        self.underruns = 0
+
+    def put(self, pcm):
+        with self.cond:
+            if len(self.packets) == self.packets.maxlen:
+                self.dropped += 1
+            self.packets.append(pcm)
+            if len(self.packets) >= self.prefill:
+                self.buffering = False
+            self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.buffering = False
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        # next PCM chunk, silence on underrun, None once closed and drained
+        with self.cond:
+            while self.buffering and not self.closed:
+                if not self.cond.wait(timeout):
+                    return b"\0" * (CHUNK_FRAMES * SAMPLE_WIDTH)
+            if self.packets:
+                return self.packets.popleft()
+            if self.closed:
+                return None
+            self.underruns += 1
+            self.buffering = True
+            return b"\0" * (CHUNK_FRAMES * SAMPLE_WIDTH)
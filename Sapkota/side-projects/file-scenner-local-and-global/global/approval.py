@@ -0,0 +1,176 @@
+import ipaddress
+import json
+import os
+import threading
+import time
+import tkinter as tk
+
+POLICY_FILE = "approval.json"
+DEFAULT_RATE = 30        # requests per minute from one peer before it is refused
+MAX_PENDING = 100        # inbox entries; anything past this is refused outright
+INBOX_REFRESH_MS = 1000
+
+# approval.json, every key optional:
+# {"allow": ["192.168.1.0/24"], "deny": ["10.0.0.9"],
+#  "peers": {"192.168.1.20": {"search": "allow", "upload": "ask"}},
+#  "default": {"search": "ask", "upload": "ask"}, "rate_per_minute": 30}
+
+class Policy:
+    # decides "allow", "deny" or "ask" for an (ip, op) without touching the UI
+    def __init__(self, path=POLICY_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.rules = {}
+        self.buckets = {}   # ip -> [tokens, last refill]
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.rules = json.load(f)
+        except (OSError, ValueError):
+            self.rules = {}
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.rules, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def _listed(self, ip, key):
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        for entry in self.rules.get(key, ()):
+            try:
+                if addr in ipaddress.ip_network(entry, strict=False):
+                    return True
+            except ValueError:
+                continue
+        return False
+
+    def _within_rate(self, ip):
+        # token bucket per peer, refilled continuously up to one minute's worth
+        rate = self.rules.get("rate_per_minute", DEFAULT_RATE)
+        now = time.time()
+        with self.lock:
+            tokens, last = self.buckets.get(ip, (rate, now))
+            tokens = min(rate, tokens + (now - last) * rate / 60)
+            if tokens < 1:
+                self.buckets[ip] = [tokens, now]
+                return False
+            self.buckets[ip] = [tokens - 1, now]
+            return True
+
+    def decide(self, ip, op):
+        if self._listed(ip, "deny"):
+            return "deny"
+        if not self._within_rate(ip):
+            return "rate"
+        rule = self.peer_rule(ip, op)
+        if rule in ("allow", "deny", "ask"):
+            return rule
+        if self._listed(ip, "allow"):
+            return "allow"
+        return self.rules.get("default", {}).get(op, "ask")
+
+    def peer_rule(self, ip, op):
+        # a rule for this op wins over the peer's "*" rule (set by "Always allow/deny peer")
+        rules = self.rules.get("peers", {}).get(ip, {})
+        return rules.get(op, rules.get("*"))
+
+    def remember(self, ip, op, verdict):
+        # op "*" covers every request type from that peer
+        with self.lock:
+            self.rules.setdefault("peers", {}).setdefault(ip, {})[op] = verdict
+        self.save()
+
+class Pending:
+    __slots__ = ("req", "what", "serve", "arrived")
+
+    def __init__(self, req, what, serve):
+        self.req = req
+        self.what = what
+        self.serve = serve
+        self.arrived = time.time()
+
+    def label(self):
+        waited = int(time.time() - self.arrived)
+        return f"{self.req.addr[0]}  {self.req.op}: {self.what}  ({waited} s)"
+
+class ApprovalInbox:
+    # requests waiting on the user; lives on the Tk thread, holds no sockets or threads
+    def __init__(self, root, policy, timeout, on_change=None):
+        self.root = root
+        self.policy = policy
+        self.timeout = timeout
+        self.on_change = on_change
+        self.pending = []
+        self.window = None
+        self.box = None
+        self.root.after(INBOX_REFRESH_MS, self._tick)
+
+    def add(self, req, what, serve):
+        if len(self.pending) >= MAX_PENDING:
+            req.resume(lambda r: r.error("BUSY"))
+            return
+        self.pending.append(Pending(req, what, serve))
+        self._changed()
+
+    def _answer(self, item, allow):
+        self.pending.remove(item)
+        item.req.resume(item.serve if allow else (lambda r: r.error("DENY")))
+
+    def _tick(self):
+        # expire requests nobody answered and drop ones whose peer went away
+        now = time.time()
+        for item in list(self.pending):
+            if item.req.cancelled.is_set():
+                self.pending.remove(item)
+                item.req.resume(lambda r: None)
+            elif now - item.arrived > self.timeout:
+                self._answer(item, False)
+        self._changed()
+        self.root.after(INBOX_REFRESH_MS, self._tick)
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(len(self.pending))
+        if self.box is not None and self.window.winfo_exists():
+            sel = self.box.curselection()
+            self.box.delete(0, tk.END)
+            self.box.insert(tk.END, *(item.label() for item in self.pending))
+            if sel and sel[0] < len(self.pending):
+                self.box.selection_set(sel[0])
+
+    def show(self):
+        if self.window is not None and self.window.winfo_exists():
+            self.window.lift()
+            return
+        self.window = win = tk.Toplevel(self.root)
+        win.title("Approval inbox")
+        win.geometry("700x300")
+        self.box = tk.Listbox(win, bg="#16222a", fg="#a0c4ff", selectmode="extended")
+        self.box.pack(fill="both", expand=True, padx=5, pady=5)
+        btns = tk.Frame(win)
+        btns.pack(fill="x", padx=5, pady=5)
+        tk.Button(btns, text="Allow", command=lambda: self._decide_selected(True)).pack(side="left", padx=2)
+        tk.Button(btns, text="Deny", command=lambda: self._decide_selected(False)).pack(side="left", padx=2)
+        tk.Button(btns, text="Always allow peer", command=lambda: self._decide_selected(True, remember=True)).pack(side="left", padx=2)
+        tk.Button(btns, text="Always deny peer", command=lambda: self._decide_selected(False, remember=True)).pack(side="left", padx=2)
+        self._changed()
+
+    def _decide_selected(self, allow, remember=False):
+        chosen = [self.pending[i] for i in self.box.curselection() if i < len(self.pending)]
+        for item in chosen:
+            if remember:
+                self.policy.remember(item.req.addr[0], "*", "allow" if allow else "deny")
+            self._answer(item, allow)
+        if remember:
+            # the new rule also settles everything else already queued from those peers
+            for item in list(self.pending):
+                verdict = self.policy.peer_rule(item.req.addr[0], item.req.op)
+                if verdict in ("allow", "deny"):
+                    self._answer(item, verdict == "allow")
+        self._changed()
@@ -0,0 +1,133 @@
+import json
+import os
+import socket
+import threading
+import time
+
+DISCOVERY_PORT = 65433
+ANNOUNCE_INTERVAL = 3    # seconds between broadcasts (and RTT probes)
+PEER_TTL = 10            # a peer silent for this long drops out of the table
+RTT_SMOOTHING = 0.3      # weight of a new sample in the running RTT average
+
+class PeerInfo:
+    __slots__ = ("ip", "port", "host", "roots", "files", "index_age", "rtt", "last_seen")
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.port = None
+        self.host = ""
+        self.roots = []
+        self.files = 0
+        self.index_age = None
+        self.rtt = None
+        self.last_seen = 0.0
+
+    def label(self):
+        rtt = f"{self.rtt * 1000:.1f} ms" if self.rtt is not None else "? ms"
+        index = f"{self.files} files, {self.index_age:.0f} s old" if self.index_age is not None else "no index"
+        return f"{self.ip}  {self.host}  {rtt}  {index}  {', '.join(self.roots)}"
+
+class Discovery:
+    # announces this peer on UDP broadcast and keeps a live table of everyone else who does
+    def __init__(self, tcp_port, describe, port=DISCOVERY_PORT):
+        self.tcp_port = tcp_port
+        self.describe = describe   # -> {"roots": [...], "files": n, "index_age": s or None}
+        self.port = port
+        self.id = os.urandom(8).hex()   # tells our own broadcasts apart from a peer's
+        self.lock = threading.Lock()
+        self.peers = {}
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.sock.bind(("", port))
+
+    def start(self):
+        threading.Thread(target=self._listen, daemon=True).start()
+        threading.Thread(target=self._announce, daemon=True).start()
+
+    def _send(self, msg, addr):
+        try:
+            self.sock.sendto(json.dumps(msg).encode(), addr)
+        except OSError:
+            pass
+
+    def _announce(self):
+        while True:
+            msg = {"t": "announce", "id": self.id, "port": self.tcp_port,
+                   "host": socket.gethostname()}
+            try:
+                msg.update(self.describe())
+            except Exception:
+                pass
+            self._send(msg, ("<broadcast>", self.port))
+            # probe every known peer directly; the echo gives the RTT
+            for ip in [p.ip for p in self.peers_by_latency()]:
+                self._send({"t": "ping", "id": self.id, "ts": time.perf_counter()}, (ip, self.port))
+            time.sleep(ANNOUNCE_INTERVAL)
+
+    def _listen(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(65535)
+                msg = json.loads(data)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(msg, dict) or msg.get("id") == self.id:
+                continue
+            kind = msg.get("t")
+            if kind == "ping":
+                self._send({"t": "pong", "id": self.id, "ts": msg.get("ts")}, addr)
+            elif kind == "pong" and isinstance(msg.get("ts"), float):
+                self._sample(addr[0], time.perf_counter() - msg["ts"])
+            elif kind == "announce":
+                self._update(addr[0], msg)
+
+    def _peer(self, ip):
+        peer = self.peers.get(ip)
+        if peer is None:
+            peer = self.peers[ip] = PeerInfo(ip)
+        peer.last_seen = time.time()
+        return peer
+
+    def _update(self, ip, msg):
+        with self.lock:
+            peer = self._peer(ip)
+            peer.port = msg.get("port")
+            peer.host = msg.get("host", "")
+            peer.roots = list(msg.get("roots", []))
+            peer.files = msg.get("files", 0)
+            peer.index_age = msg.get("index_age")
+
+    def _sample(self, ip, rtt):
+        with self.lock:
+            peer = self._peer(ip)
+            peer.rtt = rtt if peer.rtt is None else peer.rtt + RTT_SMOOTHING * (rtt - peer.rtt)
+
+    def peers_by_latency(self):
+        # live peers, fastest first; ones not measured yet go last
+        now = time.time()
+        with self.lock:
+            for ip in [ip for ip, p in self.peers.items() if now - p.last_seen > PEER_TTL]:
+                del self.peers[ip]
+            live = list(self.peers.values())
+        return sorted(live, key=lambda p: self.rank(p.ip))
+
+    def port_of(self, ip):
+        # TCP port the peer announced, or None when unknown
+        peer = self.peers.get(ip)
+        port = peer.port if peer is not None else None
+        return port if isinstance(port, int) and 0 < port < 65536 else None
+
+    def rtt(self, ip):
+        peer = self.peers.get(ip)
+        return peer.rtt if peer is not None else None
+
+    def rank(self, ip):
+        # sort key: measured peers by RTT, then everyone else
+        rtt = self.rtt(ip)
+        return (rtt is None, rtt or 0)
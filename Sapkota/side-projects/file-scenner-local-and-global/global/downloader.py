@@ -0,0 +1,196 @@
+import os
+import json
+import queue
+import hashlib
+import threading
+from peer_session import PeerError, DATA
+
+CHUNK_SIZE = 8 * 1024 * 1024
+STREAMS_PER_SOURCE = 3   # chunk requests kept in flight on each peer's session
+MAX_ATTEMPTS = 4         # per chunk, across all sources
+CHUNK_TIMEOUT = 60
+MANIFEST_TIMEOUT = 300   # the first source hashes the whole file once
+MAX_SOURCE_FAILURES = 2  # failed chunks in a row before a source is dropped
+
+class DownloadError(Exception):
+    pass
+
+class PartFile:
+    # preallocated target written at offsets; os.pwrite where available, seek+write elsewhere (Windows)
+    def __init__(self, path, size):
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        self.fd = os.open(path, flags, 0o644)
+        self.lock = threading.Lock()
+        if os.fstat(self.fd).st_size != size:
+            if hasattr(os, "posix_fallocate") and size:
+                try:
+                    os.posix_fallocate(self.fd, 0, size)
+                except OSError:
+                    pass
+            os.ftruncate(self.fd, size)
+
+    def write_at(self, data, offset):
+        if hasattr(os, "pwrite"):
+            while data:
+                n = os.pwrite(self.fd, data, offset)
+                data, offset = data[n:], offset + n
+            return
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            os.write(self.fd, data)
+
+    def close(self):
+        os.fsync(self.fd)
+        os.close(self.fd)
+
+class ChunkedDownload:
+    # fetch one file in ranged chunks from every peer that has it; resumable via a .state sidecar.
+    # Every chunk, whichever peer sent it, is checked against one per-chunk SHA-1 manifest
+    # taken from the first source, so a peer with different content cannot mix into the file.
+    def __init__(self, pool, sources, size, dest, chunk_size=CHUNK_SIZE):
+        self.pool = pool
+        self.sources = list(sources)   # [(ip, remote path)]
+        self.size = size
+        self.dest = dest
+        self.part = dest + ".part"
+        self.state_path = dest + ".part.state"
+        self.chunk_size = chunk_size
+        self.chunks = max(1, -(-size // chunk_size))
+        self.done = set()
+        self.lock = threading.Lock()
+        self.received = 0
+        self.errors = []
+        self.inflight = 0
+        self.failures = {}   # source -> failed chunks in a row, shared by its streams
+        self.manifest = None
+
+    def _fetch_manifest(self):
+        errors = []
+        for ip, path in self.sources:
+            try:
+                with self.pool.call(ip, "manifest", path=path, chunk_size=self.chunk_size) as call:
+                    manifest = call.result(timeout=MANIFEST_TIMEOUT)
+            except (PeerError, OSError) as e:
+                errors.append(f"{ip}: {e}")
+                continue
+            if manifest.get("size") != self.size or len(manifest.get("hashes", ())) != self.chunks:
+                errors.append(f"{ip}: file changed size")
+                continue
+            return manifest
+        raise DownloadError(f"no source could describe the file ({'; '.join(errors[-3:])})")
+
+    def _state_key(self):
+        # a resume is only valid for the same remote content
+        digest = hashlib.sha1("".join(self.manifest["hashes"]).encode()).hexdigest()
+        return {"size": self.size, "chunk_size": self.chunk_size,
+                "mtime": self.manifest.get("mtime"), "manifest": digest}
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        key = self._state_key()
+        if all(state.get(k) == v for k, v in key.items()) and os.path.exists(self.part):
+            self.done = set(state["done"])
+
+    def _save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict(self._state_key(), done=sorted(self.done)), f)
+        os.replace(tmp, self.state_path)
+
+    def run(self, progress=None):
+        self.manifest = self._fetch_manifest()
+        self._load_state()
+        self.received = sum(self._chunk_len(i) for i in self.done)
+        self.out = PartFile(self.part, self.size)
+        self.todo = queue.Queue()
+        self.attempts = {}
+        for i in range(self.chunks):
+            if i not in self.done:
+                self.todo.put(i)
+        self.progress = progress
+        workers = [threading.Thread(target=self._worker, args=(src,), daemon=True)
+                   for src in self.sources for _ in range(STREAMS_PER_SOURCE)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        self.out.close()
+        if len(self.done) != self.chunks:
+            raise DownloadError(f"{self.chunks - len(self.done)} chunks missing; "
+                                f"rerun to resume ({'; '.join(self.errors[-3:])})")
+        os.replace(self.part, self.dest)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+
+    def _chunk_len(self, i):
+        return min(self.chunk_size, self.size - i * self.chunk_size)
+
+    def _worker(self, source):
+        ip, path = source
+        while True:
+            try:
+                i = self.todo.get(timeout=0.2)
+            except queue.Empty:
+                # a chunk still in flight elsewhere may fail and come back
+                with self.lock:
+                    if self.inflight == 0:
+                        return
+                continue
+            with self.lock:
+                self.inflight += 1
+            try:
+                self._fetch(ip, path, i)
+                with self.lock:
+                    self.failures[source] = 0
+            except (PeerError, OSError, DownloadError) as e:
+                with self.lock:
+                    self.failures[source] = self.failures.get(source, 0) + 1
+                    self.errors.append(f"{ip}: {e}")
+                    self.attempts[i] = self.attempts.get(i, 0) + 1
+                    retry = self.attempts[i] < MAX_ATTEMPTS
+                if retry:
+                    self.todo.put(i)  # another source (or this one) picks it up again
+            finally:
+                with self.lock:
+                    self.inflight -= 1
+            with self.lock:
+                broken = self.failures.get(source, 0) >= MAX_SOURCE_FAILURES
+            if broken:
+                return  # this source looks broken (for all its streams), leave the rest to the others
+
+    def _fetch(self, ip, path, i):
+        offset, length = i * self.chunk_size, self._chunk_len(i)
+        h = hashlib.sha1()
+        pos = 0
+        with self.pool.call(ip, "read", path=path, offset=offset, length=length) as call:
+            try:
+                while True:
+                    kind, payload = call.next(timeout=CHUNK_TIMEOUT)
+                    if kind != DATA:
+                        break
+                    self.out.write_at(payload, offset + pos)
+                    h.update(payload)
+                    pos += len(payload)
+                    self._progress(len(payload))
+            except Exception:
+                self._progress(-pos)
+                raise
+        if pos != length or h.hexdigest() != self.manifest["hashes"][i]:
+            self._progress(-pos)
+            raise DownloadError(f"chunk {i} failed verification")
+        with self.lock:
+            self.done.add(i)
+            self._save_state()
+
+    def _progress(self, n):
+        with self.lock:
+            self.received += n
+            received = self.received
+        if self.progress:
+            self.progress(received, self.size)
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+# watchdog is optional; without it the index is kept fresh by periodic rescans only
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+
+RESCAN_INTERVAL = 300   # seconds between full rescans
+CHANGE_DELAY = 2        # seconds to wait after a filesystem event before rescanning
+
+def parse_query(query):
+    # one rule for indexed and walked searches: ("all", None), ("ext", ".pdf") or ("name", term)
+    q = query.strip().lower()
+    if q == "all":
+        return "all", None
+    if q.startswith("*.") or (q.startswith(".") and "." not in q[1:]):
+        return "ext", q.lstrip("*")
+    return "name", q
+
+def is_under(path, root):
+    # both already realpath'd; paths on different Windows drives have no common path
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        return False
+
+def name_matches(kind, term, name):
+    if kind == "all":
+        return True
+    lower = name.lower()
+    if kind == "ext":
+        return os.path.splitext(lower)[1] == term
+    return term in lower
+
+class Snapshot:
+    # one immutable build of the index; searches never see a half-built one
+    def __init__(self):
+        self.dirs = []                 # directory paths
+        self.dir_ids = array('I')      # record -> index in dirs
+        self.names = []                # record -> file name
+        self.sizes = array('Q')
+        self.mtimes = array('d')
+        self.by_ext = {}               # '.pdf' -> array of records
+        self.blob = ""                 # lowercase names joined by '\n' for fast substring search
+        self.starts = array('Q')       # record -> offset of its name in blob
+        self.built_at = 0.0
+        self.scan_seconds = 0.0
+        self.roots = ()                # roots this build walked; a root added later is not in it
+
+    def add_dir(self, path):
+        self.dirs.append(path)
+        return len(self.dirs) - 1
+
+    def add(self, dir_id, name, size, mtime):
+        rec = len(self.names)
+        self.dir_ids.append(dir_id)
+        self.names.append(name)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        ext = os.path.splitext(name)[1].lower()
+        self.by_ext.setdefault(ext, array('I')).append(rec)
+
+    def finish(self):
+        lowered = [n.lower() for n in self.names]
+        pos = 0
+        for n in lowered:
+            self.starts.append(pos)
+            pos += len(n) + 1
+        self.blob = "\n".join(lowered)
+        self.built_at = time.time()
+
+    def path(self, rec):
+        return os.path.join(self.dirs[self.dir_ids[rec]], self.names[rec])
+
+    def substring(self, term):
+        # str.find runs in C, so one pass over the blob replaces a Python loop per name
+        term = term.lower()
+        pos = self.blob.find(term)
+        while pos != -1:
+            rec = bisect_right(self.starts, pos) - 1
+            yield rec
+            nxt = self.starts[rec + 1] if rec + 1 < len(self.starts) else len(self.blob)
+            pos = self.blob.find(term, nxt)
+
+class FileIndex:
+    def __init__(self):
+        self.roots = []
+        self.snap = Snapshot()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.observer = None
+        self.changed_at = 0.0
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def add_root(self, root):
+        root = os.path.realpath(root)
+        with self.lock:
+            if root in self.roots:
+                return
+            self.roots.append(root)
+        if Observer is not None:
+            self._watch(root)
+        self.wake.set()
+
+    def covers(self, path):
+        path = os.path.realpath(path)
+        snap = self.snap
+        return snap.built_at > 0 and any(is_under(path, r) for r in snap.roots)
+
+    def _watch(self, root):
+        index = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                index.changed_at = time.time()
+                index.wake.set()
+
+        if self.observer is None:
+            self.observer = Observer()
+            self.observer.daemon = True
+            self.observer.start()
+        self.observer.schedule(Handler(), root, recursive=True)
+
+    def _loop(self):
+        while True:
+            self.wake.wait(RESCAN_INTERVAL)
+            self.wake.clear()
+            # let a burst of filesystem events settle before rescanning
+            while time.time() - self.changed_at < CHANGE_DELAY:
+                time.sleep(CHANGE_DELAY)
+            if self.roots:
+                self.rebuild()
+
+    def rebuild(self):
+        start = time.time()
+        snap = Snapshot()
+        snap.roots = tuple(self.roots)
+        for root in snap.roots:
+            stack = [root]
+            while stack:
+                d = stack.pop()
+                dir_id = snap.add_dir(d)
+                try:
+                    with os.scandir(d) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    stack.append(entry.path)
+                                elif entry.is_file():
+                                    st = entry.stat()
+                                    snap.add(dir_id, entry.name, st.st_size, st.st_mtime)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+        snap.finish()
+        snap.scan_seconds = time.time() - start
+        self.snap = snap
+
+    def search(self, query, root=None):
+        # yields (path, size, mtime); matches exactly what walk_matches would (see parse_query)
+        snap = self.snap
+        kind, term = parse_query(query)
+        if kind == "all":
+            recs = range(len(snap.names))
+        elif kind == "ext":
+            recs = snap.by_ext.get(term, ())
+        else:
+            recs = snap.substring(term)
+        root = os.path.realpath(root) if root else None
+        for rec in recs:
+            d = snap.dirs[snap.dir_ids[rec]]
+            if root and not is_under(d, root):
+                continue
+            yield snap.path(rec), snap.sizes[rec], snap.mtimes[rec]
+
+    def stats(self):
+        snap = self.snap
+        # rough: name blob + dir strings + arrays (28 B) and a str object (~56 B) per record
+        approx = len(snap.blob) + sum(len(d) for d in snap.dirs) + len(snap.names) * (28 + 56)
+        return {
+            "roots": list(self.roots),
+            "files": len(snap.names),
+            "dirs": len(snap.dirs),
+            "index_bytes": approx,
+            "built_at": snap.built_at,
+            "age_seconds": round(time.time() - snap.built_at, 1) if snap.built_at else None,
+            "scan_seconds": round(snap.scan_seconds, 3),
+            "live_updates": Observer is not None,
+        }
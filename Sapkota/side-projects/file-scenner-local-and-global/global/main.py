@@ -1,11 +1,104 @@
 import tkinter as tk
-from tkinter import messagebox, simpledialog, scrolledtext
+from tkinter import messagebox, scrolledtext
 import threading
 import socket
 import os
+import time
+import queue
+import hashlib
+import ipaddress
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from peer_session import SessionPool, PeerError, serve_forever
+from file_index import FileIndex, parse_query, name_matches, is_under
+from downloader import ChunkedDownload
+from discovery import Discovery
+from approval import Policy, ApprovalInbox
+from preview import (PreviewCache, PREVIEW_BYTES, MAX_PREVIEW_BYTES, is_image, thumbnail,
+                     looks_binary, hexdump)
 
 PORT = 65432
-BUFFER_SIZE = 4096
+BUFFER_SIZE = 64 * 1024
+APPROVAL_TIMEOUT = 300  # seconds the remote user has to answer a request
+REPLY_TIMEOUT = 60      # seconds an approved request may take to answer
+SEARCH_BATCH = 500      # matches per streamed result frame
+SEARCH_FLUSH = 0.1      # ...or whatever was found in this many seconds
+DISPLAY_PAGE = 1000     # listbox rows shown before "Load more"
+UI_POLL_MS = 50
+FANOUT_WORKERS = 64
+FANOUT_CONNECT_TIMEOUT = 1.5  # dead hosts in a subnet sweep should not hold the search up
+MANIFEST_CACHE = 32     # chunk manifests kept for files being served
+SIDE_WORKERS = 4        # duplicate checks and previews, kept apart from searches parked on approval
+MAX_SUBNET_HOSTS = 1024
+FINGERPRINT_SPAN = 1024 * 1024  # bytes hashed from each end of a file for de-duplication
+PEER_REFRESH_MS = 1000
+
+def walk_matches(root, name):
+    # iterative scandir walk yielding (path, size, mtime), same query rule as FileIndex.search
+    kind, term = parse_query(name)
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file() and name_matches(kind, term, entry.name):
+                            st = entry.stat()
+                            yield entry.path, st.st_size, st.st_mtime
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+def parse_peers(text):
+    # "10.0.0.5, 10.0.0.7" or a subnet like "192.168.1.0/24"
+    peers = []
+    for token in text.replace(",", " ").split():
+        if "/" in token:
+            try:
+                hosts = ipaddress.ip_network(token, strict=False).hosts()
+            except ValueError:
+                continue
+            for i, host in enumerate(hosts):
+                if i >= MAX_SUBNET_HOSTS:
+                    break
+                peers.append(str(host))
+        else:
+            peers.append(token)
+    return list(dict.fromkeys(peers))
+
+def fingerprint(path):
+    # size plus both ends of the file: cheap, and enough to tell copies apart in practice
+    size = os.path.getsize(path)
+    h = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        h.update(f.read(FINGERPRINT_SPAN))
+        if size > 2 * FINGERPRINT_SPAN:
+            f.seek(-FINGERPRINT_SPAN, os.SEEK_END)
+            h.update(f.read(FINGERPRINT_SPAN))
+        else:
+            h.update(f.read())
+    return h.hexdigest()
+
+class Hit:
+    # one result row; sources lists every (peer, path) holding the same content
+    __slots__ = ("path", "size", "mtime", "sources", "fingerprint", "pending", "row")
+
+    def __init__(self, path, size, ip, mtime=None):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.sources = [(ip, path)]
+        self.fingerprint = None
+        self.pending = 0
+        self.row = None
+
+    def label(self):
+        peers = ", ".join(ip for ip, _ in self.sources)
+        extra = f" (+{self.pending} checking)" if self.pending else ""
+        return f"{os.path.basename(self.path)} {(int(self.size)/1024):.2f} KB  [{peers}]{extra}"
 
 class FileSearchApp:
     def __init__(self, root):
@@ -23,10 +116,11 @@ class FileSearchApp:
         preview_bg = "#0f1820"
         preview_fg = "#cfd8dc"
 
-        tk.Label(root, text="Peer IP:", fg=label_fg, bg=root["bg"]).grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        # blank = every peer discovered on the LAN, fastest first
+        tk.Label(root, text="Peer IPs:", fg=label_fg, bg=root["bg"]).grid(row=0, column=0, padx=10, pady=5, sticky="w")
         self.ip_entry = tk.Entry(root, bg=entry_bg, fg=label_fg)
         self.ip_entry.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
-        tk.Button(root, text="Test Conn", bg=btn_bg, fg=btn_fg, command=self.test_connection).grid(row=0, column=2, padx=10)
+        tk.Button(root, text="Peers 📡", bg=btn_bg, fg=btn_fg, command=self.show_peers).grid(row=0, column=2, padx=10)
 
         tk.Label(root, text="Filename:", fg=label_fg, bg=root["bg"]).grid(row=1, column=0, padx=10, pady=5, sticky="w")
         self.filename_entry = tk.Entry(root, bg=entry_bg, fg=label_fg)
@@ -47,144 +141,454 @@ class FileSearchApp:
         self.preview_text.grid(row=4, column=0, columnspan=3, sticky="nsew", padx=10, pady=5)
 
         self.status_label = tk.Label(root, text="Status: Waiting...", fg=label_fg, bg=root["bg"])
-        self.status_label.grid(row=5, column=0, columnspan=3, sticky="w", padx=10)
+        self.status_label.grid(row=5, column=0, columnspan=2, sticky="w", padx=10)
+
+        result_btns = tk.Frame(root, bg=root["bg"])
+        result_btns.grid(row=5, column=2, padx=10, pady=5)
+        self.inbox_btn = tk.Button(result_btns, text="Inbox (0)", bg=btn_bg, fg=btn_fg, command=lambda: self.inbox.show())
+        self.inbox_btn.pack(side="left", padx=2)
+        tk.Button(result_btns, text="Index Path 📇", bg=btn_bg, fg=btn_fg, command=self.index_path).pack(side="left", padx=2)
+        tk.Button(result_btns, text="Load more", bg=btn_bg, fg=btn_fg, command=self.load_more).pack(side="left", padx=2)
+        tk.Button(result_btns, text="Download ⬇", bg="#7ab317", fg=btn_fg, command=self.download_selected).pack(side="left", padx=2)
 
         root.grid_columnconfigure(1, weight=1)
         root.grid_rowconfigure(3, weight=1)
         root.grid_rowconfigure(4, weight=1)
 
         self.files_found = []
+        self.shown = 0            # rows of files_found currently in the listbox
+        self.display_cap = DISPLAY_PAGE
+        self.search_gen = 0       # bumps per search so late batches of an old one are ignored
+        self.search_calls = []
+        self.calls_lock = threading.Lock()  # search_calls and search_gen, shared with fan-out workers
+        self.by_key = {}          # (name, size) -> first Hit, for cross-peer de-duplication
+        self.peer_state = {}
+        self.fanout = ThreadPoolExecutor(max_workers=FANOUT_WORKERS)
+        self.side_pool = ThreadPoolExecutor(max_workers=SIDE_WORKERS)
+        self.manifests = {}   # (path, size, mtime, chunk size) -> chunk SHA-1s, for files we serve
+        self.manifest_lock = threading.Lock()
+        self.ui_queue = queue.Queue()
+        self.pool = SessionPool(PORT, port_of=self._port_of)  # one persistent session per peer
+        self.index = FileIndex()       # optional: only roots added with "Index Path" are indexed
+        self.peer_window = None
+        self.preview_cache = PreviewCache()
+        self.preview_image = None
+        self.policy = Policy()
+        self.inbox = ApprovalInbox(root, self.policy, APPROVAL_TIMEOUT,
+                                   on_change=lambda n: self.inbox_btn.config(text=f"Inbox ({n})"))
+        self.discovery = None   # stays None when the UDP port cannot be bound; typed IPs still work
+        try:
+            discovery = Discovery(PORT, self._describe)
+            discovery.start()
+            self.discovery = discovery
+        except OSError as e:
+            self.log_status(f"LAN discovery unavailable: {e}")
+        self.root.after(UI_POLL_MS, self._poll_ui)
         threading.Thread(target=self.start_server, daemon=True).start()
 
     def log_status(self, msg):
         self.status_label.config(text=f"Status: {msg}")
 
-    def start_server(self):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as srv:
-            srv.bind(("", PORT))
-            srv.listen()
-            self.log_status(f"Listening on port {PORT}")
+    def ui(self, fn, *args):
+        # worker threads hand listbox/status updates to the Tk loop through here
+        self.ui_queue.put((fn, args))
+
+    def _poll_ui(self):
+        try:
             while True:
-                conn, addr = srv.accept()
-                threading.Thread(target=self.handle_client, args=(conn, addr), daemon=True).start()
+                fn, args = self.ui_queue.get_nowait()
+                fn(*args)
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(UI_POLL_MS, self._poll_ui)
 
-    def handle_client(self, conn, addr):
-        with conn:
-            try:
-                cmd = conn.recv(1024).decode()
-                if cmd == "HELLO":
-                    conn.sendall("ACK".encode())
-                    return
-                if cmd == "REQ_SEARCH":
-                    fn = conn.recv(1024).decode()
-                    rp = conn.recv(1024).decode()
-                    allow = messagebox.askyesno("Search Request",
-                        f"{addr[0]} wants to search '{fn}' in:\n{rp}\nAllow?")
-                    conn.sendall(("ACCEPT" if allow else "DENY").encode())
-                    if not allow: return
-                    matches = []
-                    if os.path.isdir(rp):
-                        for rd, _, files in os.walk(rp):
-                            for f in files:
-                                if fn.lower() == "all" or fn.lower() in f.lower():
-                                    p = os.path.join(rd, f)
-                                    matches.append(f"{p}|{os.path.getsize(p)}")
-                    resp = "\n".join(matches) if matches else "NOFILES"
-                    conn.sendall(resp.encode())
-                    idx = conn.recv(1024).decode()
-                    if idx.isdigit():
-                        i = int(idx) - 1
-                        if 0 <= i < len(matches):
-                            path = matches[i].split("|")[0]
-                            with open(path, "rb") as F:
-                                data = F.read(BUFFER_SIZE)
-                                while data:
-                                    conn.sendall(data)
-                                    data = F.read(BUFFER_SIZE)
-                if cmd == "REQ_SEND":
-                    name = conn.recv(1024).decode()
-                    size = int(conn.recv(1024).decode())
-                    allow = messagebox.askyesno("Send Request",
-                        f"{addr[0]} wants to send:\n{name} ({size} bytes)\nAllow?")
-                    conn.sendall(("ACCEPT" if allow else "DENY").encode())
-                    if not allow: return
-                    save = os.path.join(os.getcwd(), name)
-                    with open(save, "wb") as F:
-                        rec = 0
-                        while rec < size:
-                            chunk = conn.recv(min(BUFFER_SIZE, size-rec))
-                            if not chunk: break
-                            F.write(chunk)
-                            rec += len(chunk)
-                    messagebox.showinfo("Received", f"Saved {name}")
-            except:
-                pass
-
-    def test_connection(self):
-        ip = self.ip_entry.get().strip()
-        if not ip:
-            messagebox.showwarning("Input Error", "Enter IP")
+    def start_server(self):
+        handlers = {
+            "hello": self.handle_hello,
+            "search": self.handle_search,
+            "download": self.handle_download,
+            "upload": self.handle_upload,
+            "stats": self.handle_stats,
+            "hash": self.handle_hash,
+            "read": self.handle_read,
+            "manifest": self.handle_manifest,
+            "preview": self.handle_preview,
+        }
+        serve_forever(PORT, handlers, on_listen=lambda: self.log_status(f"Listening on port {PORT}"))
+
+    def _allowed(self, req, path):
+        # files are only served from roots this connection was allowed to search
+        path = os.path.realpath(path)
+        return any(is_under(path, r) for r in req.conn.state.get("roots", ()))
+
+    def handle_hello(self, req):
+        req.end({"host": socket.gethostname()})
+
+    def _gate(self, req, what, serve):
+        # policy answers most requests on the spot; the rest wait in the inbox without a thread
+        verdict = self.policy.decide(req.addr[0], req.op)
+        if verdict == "allow":
+            serve(req)
+        elif verdict == "ask":
+            req.park()
+            self.ui(self.inbox.add, req, what, serve)
+        else:
+            req.error("RATE" if verdict == "rate" else "DENY")
+
+    def handle_search(self, req):
+        self._gate(req, f"search '{req.args['name']}' in {req.args['root']}", self._serve_search)
+
+    def _serve_search(self, req):
+        fn, rp = req.args["name"], req.args["root"]
+        req.conn.state.setdefault("roots", set()).add(os.path.realpath(rp))
+        # indexed roots answer from memory, anything else is walked and streamed as found
+        if self.index.covers(rp):
+            source = self.index.search(fn, rp)
+        else:
+            source = walk_matches(rp, fn)
+        total, batch, flushed = 0, [], time.time()
+        for p, size, mtime in source:
+            if req.cancelled.is_set():
+                return
+            batch.append([p, size, mtime])
+            total += 1
+            if len(batch) >= SEARCH_BATCH or time.time() - flushed > SEARCH_FLUSH:
+                req.reply({"matches": batch})
+                batch, flushed = [], time.time()
+        if batch:
+            req.reply({"matches": batch})
+        req.end({"total": total})
+
+    def handle_hash(self, req):
+        hashes = []
+        for path in req.args["paths"]:
+            hashes.append(fingerprint(path) if self._allowed(req, path) else None)
+        req.end({"hashes": hashes})
+
+    def handle_stats(self, req):
+        req.end(self.index.stats())
+
+    def index_path(self):
+        path = self.path_entry.get().strip()
+        if not os.path.isdir(path):
+            messagebox.showwarning("Index", "Enter a local folder in Remote Path to index it")
             return
-        try:
-            with socket.socket() as s:
-                s.connect((ip, PORT))
-                s.sendall("HELLO".encode())
-                if s.recv(1024).decode() == "ACK":
-                    messagebox.showinfo("Connected", f"{ip} online")
-                    self.log_status("Handshake OK")
-                else:
-                    raise
-        except:
-            messagebox.showerror("Failed", "No ACK")
-            self.log_status("Handshake failed")
+        self.index.add_root(path)
+        self.log_status(f"Indexing {path} in the background")
+
+    def handle_download(self, req):
+        path = req.args["path"]
+        if not self._allowed(req, path) or not os.path.isfile(path):
+            req.error("DENY")
+            return
+        sent = 0
+        with open(path, "rb") as F:
+            while not req.cancelled.is_set() and (data := F.read(BUFFER_SIZE)):
+                req.send_data(data)
+                sent += len(data)
+        req.end({"size": sent})
+
+    def handle_read(self, req):
+        # one byte range of a file, with the SHA-1 of exactly what was sent
+        path = req.args["path"]
+        offset, length = int(req.args["offset"]), int(req.args["length"])
+        if not self._allowed(req, path) or not os.path.isfile(path):
+            req.error("DENY")
+            return
+        h = hashlib.sha1()
+        with open(path, "rb") as F:
+            F.seek(offset)
+            while length > 0 and not req.cancelled.is_set():
+                data = F.read(min(BUFFER_SIZE, length))
+                if not data:
+                    break
+                h.update(data)
+                req.send_data(data)
+                length -= len(data)
+        req.end({"sha1": h.hexdigest()})
+
+    def handle_manifest(self, req):
+        # SHA-1 of every chunk, which downloaders check all sources' chunks against
+        path = req.args["path"]
+        chunk_size = int(req.args["chunk_size"])
+        if not self._allowed(req, path) or not os.path.isfile(path) or chunk_size <= 0:
+            req.error("DENY")
+            return
+        st = os.stat(path)
+        key = (os.path.realpath(path), st.st_size, st.st_mtime, chunk_size)
+        with self.manifest_lock:
+            hashes = self.manifests.get(key)
+        if hashes is None:
+            hashes = []
+            with open(path, "rb") as F:
+                while len(hashes) * chunk_size < st.st_size or not hashes:
+                    h, left = hashlib.sha1(), chunk_size
+                    while left > 0:
+                        if req.cancelled.is_set():
+                            return
+                        data = F.read(min(BUFFER_SIZE, left))
+                        if not data:
+                            break
+                        h.update(data)
+                        left -= len(data)
+                    hashes.append(h.hexdigest())
+            if os.stat(path).st_mtime != st.st_mtime:
+                req.error("file changed while hashing")
+                return
+            with self.manifest_lock:
+                if len(self.manifests) >= MANIFEST_CACHE:
+                    self.manifests.pop(next(iter(self.manifests)))
+                self.manifests[key] = hashes
+        req.end({"size": st.st_size, "mtime": st.st_mtime, "hashes": hashes})
+
+    def handle_preview(self, req):
+        # meta first, then either a PNG thumbnail or the requested byte range
+        path = req.args["path"]
+        if not self._allowed(req, path) or not os.path.isfile(path):
+            req.error("DENY")
+            return
+        st = os.stat(path)
+        thumb = thumbnail(path) if req.args.get("thumb") and is_image(path) else None
+        if thumb is not None:
+            req.reply({"size": st.st_size, "mtime": st.st_mtime, "thumb": True})
+            req.send_data(thumb)
+        else:
+            offset = int(req.args.get("offset", 0))
+            length = min(int(req.args.get("length", PREVIEW_BYTES)), MAX_PREVIEW_BYTES)
+            req.reply({"size": st.st_size, "mtime": st.st_mtime, "thumb": False, "offset": offset})
+            with open(path, "rb") as F:
+                F.seek(offset)
+                req.send_data(F.read(length))
+        req.end()
+
+    def handle_upload(self, req):
+        name = os.path.basename(req.args["name"])
+        self._gate(req, f"send {name} ({int(req.args['size'])} bytes)", self._serve_upload)
+
+    def _serve_upload(self, req):
+        name = os.path.basename(req.args["name"])
+        req.reply({"accept": True})
+        save = os.path.join(os.getcwd(), name)
+        rec = 0
+        with open(save, "wb") as F:
+            for chunk in req.data():
+                F.write(chunk)
+                rec += len(chunk)
+        req.end({"received": rec})
+        self.ui(self.log_status, f"Received {name} from {req.addr[0]}")
+
+    def _describe(self):
+        # what our discovery broadcasts say about us
+        stats = self.index.stats()
+        return {"roots": stats["roots"], "files": stats["files"], "index_age": stats["age_seconds"]}
+
+    def _discovered(self):
+        return self.discovery.peers_by_latency() if self.discovery is not None else []
+
+    def _port_of(self, ip):
+        # a discovered peer is reached on the port it announced, anyone else on PORT
+        return self.discovery.port_of(ip) if self.discovery is not None else None
+
+    def _rank(self, ip):
+        return self.discovery.rank(ip) if self.discovery is not None else (True, 0)
+
+    def _peers(self):
+        # typed IPs (or subnets) if any, otherwise the discovered ones; fastest first either way
+        typed = parse_peers(self.ip_entry.get())
+        if not typed:
+            return [p.ip for p in self._discovered()]
+        return sorted(typed, key=self._rank)
+
+    def show_peers(self):
+        if self.peer_window is not None and self.peer_window.winfo_exists():
+            self.peer_window.lift()
+            return
+        self.peer_window = win = tk.Toplevel(self.root)
+        win.title("Peers on this network")
+        win.geometry("700x250")
+        box = tk.Listbox(win, bg="#16222a", fg="#a0c4ff", font=("Courier", 10))
+        box.pack(fill="both", expand=True)
+        box.bind("<Double-Button-1>", lambda e: self._use_peer(box))
+        self._refresh_peers(win, box)
+
+    def _refresh_peers(self, win, box):
+        if not win.winfo_exists():
+            return
+        peers = self._discovered()
+        box.delete(0, tk.END)
+        box.insert(tk.END, *(p.label() for p in peers))
+        if not peers:
+            box.insert(tk.END, "No peers heard yet...")
+        win.after(PEER_REFRESH_MS, self._refresh_peers, win, box)
+
+    def _use_peer(self, box):
+        idx = box.curselection()
+        if idx and not box.get(idx[0]).startswith("No peers"):
+            self.ip_entry.delete(0, tk.END)
+            self.ip_entry.insert(0, box.get(idx[0]).split()[0])
 
     def search_files(self):
-        ip = self.ip_entry.get().strip()
+        peers = self._peers()
         fn = self.filename_entry.get().strip()
         rp = self.path_entry.get().strip()
-        if not ip or not fn or not rp:
+        if not fn or not rp:
             messagebox.showwarning("Input Error", "Fill all fields")
             return
-        threading.Thread(target=self._search, args=(ip, fn, rp), daemon=True).start()
+        if not peers:
+            messagebox.showwarning("No Peers", "No peers discovered yet; enter an IP")
+            return
+        with self.calls_lock:
+            calls, self.search_calls = self.search_calls, []
+            self.search_gen += 1
+            gen = self.search_gen
+        for call in calls:
+            call.cancel()
+        self._reset_results(peers)
+        # every peer is queried at once (fastest submitted first); each streams into the same view
+        for ip in peers:
+            self.fanout.submit(self._search_peer, gen, ip, fn, rp)
+
+    def _search_peer(self, gen, ip, fn, rp):
+        try:
+            session = self.pool.get(ip)
+            session.connect(timeout=FANOUT_CONNECT_TIMEOUT)
+            with session.call("search", name=fn, root=rp) as call:
+                with self.calls_lock:
+                    if gen != self.search_gen:
+                        return  # superseded while connecting; leaving the block cancels it
+                    self.search_calls.append(call)
+                # the first batch also waits for the remote user to approve
+                for item in call.items(timeout=APPROVAL_TIMEOUT):
+                    self.ui(self._add_results, gen, ip, item["matches"])
+            self.ui(self._peer_done, gen, ip, "ok")
+        except PeerError as e:
+            state = {"DENY": "denied", "RATE": "rate-limited", "BUSY": "busy"}.get(str(e), "failed")
+            self.ui(self._peer_done, gen, ip, state)
+        except OSError:
+            self.ui(self._peer_done, gen, ip, "unreachable")
+
+    def _reset_results(self, peers):
+        self.files_found = []
+        self.by_key = {}
+        self.shown = 0
+        self.display_cap = DISPLAY_PAGE
+        self.peer_state = {ip: "searching" for ip in peers}
+        self.result_listbox.delete(0, tk.END)
+        self._search_status()
+
+    def _search_status(self):
+        counts = {}
+        for state in self.peer_state.values():
+            counts[state] = counts.get(state, 0) + 1
+        detail = ", ".join(f"{n} {state}" for state, n in sorted(counts.items()))
+        self.log_status(f"{len(self.files_found)} files from {len(self.peer_state)} peers ({detail})")
+
+    def _add_results(self, gen, ip, matches):
+        if gen != self.search_gen:
+            return
+        checking = []
+        for p, sz, *rest in matches:  # older peers send no mtime
+            key = (os.path.basename(p).lower(), sz)
+            hit = self.by_key.get(key)
+            if hit is not None and all(src[0] != ip for src in hit.sources):
+                # same name and size on another peer: merge once the content hashes agree
+                hit.pending += 1
+                checking.append(hit)
+                self.side_pool.submit(self._verify_duplicate, gen, hit, ip, p)
+                continue
+            hit = Hit(p, sz, ip, rest[0] if rest else None)
+            self.by_key.setdefault(key, hit)
+            self.files_found.append(hit)
+        self._show_rows()
+        for hit in checking:
+            self._refresh_row(hit)
+        self._search_status()
+
+    def _verify_duplicate(self, gen, hit, ip, path):
+        try:
+            if hit.fingerprint is None:
+                src_ip, src_path = hit.sources[0]
+                with self.pool.call(src_ip, "hash", paths=[src_path]) as call:
+                    hit.fingerprint = call.result(timeout=REPLY_TIMEOUT)["hashes"][0]
+            with self.pool.call(ip, "hash", paths=[path]) as call:
+                other = call.result(timeout=REPLY_TIMEOUT)["hashes"][0]
+        except (PeerError, OSError, KeyError):
+            other = None
+        self.ui(self._merge_duplicate, gen, hit, ip, path, other is not None and other == hit.fingerprint)
+
+    def _merge_duplicate(self, gen, hit, ip, path, same):
+        if gen != self.search_gen:
+            return
+        hit.pending -= 1
+        if same:
+            hit.sources.append((ip, path))
+        else:
+            self.files_found.append(Hit(path, hit.size, ip))
+        self._show_rows()
+        self._refresh_row(hit)
+
+    def _refresh_row(self, hit):
+        if hit.row is not None:
+            self.result_listbox.delete(hit.row)
+            self.result_listbox.insert(hit.row, hit.label())
+
+    def _peer_done(self, gen, ip, state):
+        if gen != self.search_gen:
+            return
+        self.peer_state[ip] = state
+        self._search_status()
+        if all(s != "searching" for s in self.peer_state.values()) and not self.files_found:
+            messagebox.showinfo("No Files", "No matches")
+
+    def _show_rows(self):
+        # listbox only ever holds up to display_cap rows; the rest waits for "Load more"
+        end = min(len(self.files_found), self.display_cap)
+        if end > self.shown:
+            new = self.files_found[self.shown:end]
+            for i, hit in enumerate(new, self.shown):
+                hit.row = i
+            self.result_listbox.insert(tk.END, *(hit.label() for hit in new))
+            self.shown = end
+
+    def load_more(self):
+        self.display_cap += DISPLAY_PAGE
+        self._show_rows()
+        self._search_status()
+
+    def download_selected(self):
+        idx = self.result_listbox.curselection()
+        if not idx:
+            messagebox.showwarning("Download", "Select a search result first")
+            return
+        hit = self.files_found[idx[0]]
+        threading.Thread(target=self._download_worker, args=(hit,), daemon=True).start()
 
-    def _search(self, ip, fn, rp):
+    def _download_worker(self, hit):
+        # ranged chunks from every peer holding the file; rerunning resumes a broken download
+        save = os.path.basename(hit.path)
+        sources = sorted(hit.sources, key=lambda s: self._rank(s[0]))
+        last = [0.0]
+
+        def progress(done, total):
+            if time.time() - last[0] > 0.25:
+                last[0] = time.time()
+                self.ui(self.log_status, f"Downloading {save}: {done * 100 // max(total, 1)}% "
+                        f"from {len(hit.sources)} peer(s)")
         try:
-            with socket.socket() as s:
-                s.connect((ip, PORT))
-                s.sendall("REQ_SEARCH".encode())
-                s.sendall(fn.encode())
-                s.sendall(rp.encode())
-                resp = s.recv(4096).decode()
-                if resp == "DENY":
-                    messagebox.showinfo("Denied", "Request denied")
-                    return
-                if resp == "NOFILES":
-                    messagebox.showinfo("No Files", "No matches")
-                    return
-                self.files_found = resp.split("\n")
-                self.result_listbox.delete(0, tk.END)
-                for i, line in enumerate(self.files_found, 1):
-                    p, sz = line.split("|")
-                    self.result_listbox.insert(tk.END, f"{i}. {os.path.basename(p)} {(int(sz)/1024):.2f} KB")
-                choice = simpledialog.askinteger("Download", "Number to download?")
-                if not choice: return
-                s.sendall(str(choice).encode())
-                save = os.path.basename(self.files_found[choice-1].split("|")[0])
-                with open(save, "wb") as F:
-                    data = s.recv(BUFFER_SIZE)
-                    while data:
-                        F.write(data)
-                        data = s.recv(BUFFER_SIZE)
-                messagebox.showinfo("Downloaded", f"Saved {save}")
+            ChunkedDownload(self.pool, sources, int(hit.size), save).run(progress)
+            self.ui(self.log_status, f"Downloaded {save}")
+            self.ui(messagebox.showinfo, "Downloaded", f"Saved {save}")
         except Exception as e:
-            messagebox.showerror("Error", str(e))
-            self.log_status("Search failed")
+            self.ui(messagebox.showerror, "Error", str(e))
+            self.ui(self.log_status, "Download failed")
 
     def send_request(self):
-        ip = self.ip_entry.get().strip()
+        # to the typed peer, or else the lowest-RTT one discovered on the LAN
+        ip = (self._peers() or [""])[0]
         path = self.filename_entry.get().strip()
         if not ip or not os.path.isfile(path):
-            messagebox.showwarning("Error", "Enter IP & valid file")
+            messagebox.showwarning("Error", "Enter a valid file, and an IP if no peer was discovered")
             return
         threading.Thread(target=self._send, args=(ip, path), daemon=True).start()
 
@@ -192,33 +596,86 @@ class FileSearchApp:
         try:
             name = os.path.basename(path)
             size = os.path.getsize(path)
-            with socket.socket() as s:
-                s.connect((ip, PORT))
-                s.sendall("REQ_SEND".encode())
-                s.sendall(name.encode())
-                s.sendall(str(size).encode())
-                resp = s.recv(1024).decode()
-                if resp == "DENY":
-                    messagebox.showinfo("Denied", "Peer declined")
-                    return
+            with self.pool.call(ip, "upload", name=name, size=size) as call:
+                try:
+                    call.result(timeout=APPROVAL_TIMEOUT)
+                except PeerError as e:
+                    if str(e) == "DENY":
+                        self.ui(messagebox.showinfo, "Denied", "Peer declined")
+                        return
+                    raise
                 with open(path, "rb") as F:
-                    data = F.read(BUFFER_SIZE)
-                    while data:
-                        s.sendall(data)
-                        data = F.read(BUFFER_SIZE)
-                messagebox.showinfo("Sent", f"{name} sent")
+                    while data := F.read(BUFFER_SIZE):
+                        call.send_data(data)
+                call.end()
+                call.result(timeout=REPLY_TIMEOUT)
+            self.ui(messagebox.showinfo, "Sent", f"{name} sent")
         except Exception as e:
-            messagebox.showerror("Error", str(e))
-            self.log_status("Send failed")
+            self.ui(messagebox.showerror, "Error", str(e))
+            self.ui(self.log_status, "Send failed")
 
     def preview_remote_file(self, event):
         idx = self.result_listbox.curselection()
         if not idx:
             return
-        p, sz = self.files_found[idx[0]].split("|")
+        self._preview(self.files_found[idx[0]], 0)
+
+    def _preview(self, hit, offset):
+        # served from the cache when this peer/path/mtime was fetched before, else fetched in the background
+        ip, path = hit.sources[0]
+        thumb = offset == 0 and is_image(path)
+        key = (ip, path, hit.mtime, "thumb" if thumb else offset)
+        cached = self.preview_cache.get(key) if hit.mtime is not None else None
+        if cached is not None:
+            self._show_preview(hit, *cached)
+            return
+        if offset == 0:
+            self._set_preview(f"{path}\n{int(hit.size)} bytes\n\nLoading preview from {ip}...")
+        self.side_pool.submit(self._fetch_preview, hit, ip, path, offset, thumb)
+
+    def _fetch_preview(self, hit, ip, path, offset, thumb):
+        try:
+            with self.pool.call(ip, "preview", path=path, offset=offset, length=PREVIEW_BYTES, thumb=thumb) as call:
+                meta = call.result(timeout=30)
+                data = b"".join(call.data(timeout=30))
+        except (PeerError, OSError) as e:
+            self.ui(self._set_preview, f"{path}\n{int(hit.size)} bytes\n\nNo preview: {e}")
+            return
+        hit.mtime = meta["mtime"]
+        # stored under what was asked for, so a peer without Pillow is not asked again
+        self.preview_cache.put((ip, path, hit.mtime, "thumb" if thumb else offset), (meta, data))
+        self.ui(self._show_preview, hit, meta, data)
+
+    def _set_preview(self, text):
         self.preview_text.config(state="normal")
         self.preview_text.delete("1.0", "end")
-        self.preview_text.insert("end", f"{p}\n{int(sz)} bytes")
+        self.preview_text.insert("end", text)
+        self.preview_text.config(state="disabled")
+
+    def _show_preview(self, hit, meta, data):
+        sel = self.result_listbox.curselection()
+        if not sel or self.files_found[sel[0]] is not hit:
+            return  # the user moved on while this was loading
+        offset = meta.get("offset", 0)
+        if offset == 0:
+            self._set_preview(f"{hit.path}\n{meta['size']} bytes\n\n")
+        self.preview_text.config(state="normal")
+        more = self.preview_text.tag_ranges("more")
+        if more:
+            self.preview_text.delete(*more)
+        if meta["thumb"]:
+            self.preview_image = tk.PhotoImage(data=base64.b64encode(data))
+            self.preview_text.image_create("end", image=self.preview_image)
+        elif looks_binary(data):
+            self.preview_text.insert("end", hexdump(data))
+        else:
+            self.preview_text.insert("end", data.decode("utf-8", errors="replace"))
+            end = offset + len(data)
+            if end < meta["size"]:
+                # a ranged read for the next piece when the user asks for it
+                self.preview_text.insert("end", f"\n[... {meta['size'] - end} more bytes, click to load]", "more")
+                self.preview_text.tag_config("more", foreground="#4a90e2", underline=True)
+                self.preview_text.tag_bind("more", "<Button-1>", lambda e: self._preview(hit, end))
         self.preview_text.config(state="disabled")
 
 if __name__ == "__main__":
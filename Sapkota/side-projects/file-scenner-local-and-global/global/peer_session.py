@@ -0,0 +1,373 @@
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# one frame: request id, kind, payload length. Many requests share one TCP connection.
+HEADER = struct.Struct('!IBI')
+REQ, ITEM, DATA, END, ERR, PING, PONG, CANCEL = range(1, 9)
+KEEPALIVE = 15          # seconds between pings on an idle session
+DEAD_AFTER = 3          # missed keepalive intervals before a session is dropped
+CONNECT_TIMEOUT = 5
+CALL_BACKLOG = 256      # frames buffered per call before the reader waits
+
+class PeerError(Exception):
+    pass
+
+class ConnectionLost(OSError):
+    # a reply could not be sent; raised by PeerConnection.send so that handler
+    # errors (a missing file, a denied open) are told apart and still answered
+    pass
+
+def recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("peer closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+def read_frame(sock):
+    rid, kind, size = HEADER.unpack(recv_exact(sock, HEADER.size))
+    return rid, kind, recv_exact(sock, size) if size else b""
+
+def pack(rid, kind, payload=b""):
+    if not isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = json.dumps(payload).encode()
+    return HEADER.pack(rid, kind, len(payload)) + bytes(payload)
+
+class Call:
+    # client side of one request; frames for it arrive on self.frames
+    def __init__(self, session, rid):
+        self.session = session
+        self.rid = rid
+        self.frames = queue.Queue(maxsize=CALL_BACKLOG)
+        self.done = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # leaving early (timeout, bad data, any exception) must not leave the peer streaming
+        self.cancel()
+
+    def next(self, timeout=None):
+        try:
+            kind, payload = self.frames.get(timeout=timeout)
+        except queue.Empty:
+            # forget it and tell the peer, or its frames fill our queue and wedge the reader
+            self.cancel()
+            raise PeerError("peer did not answer in time")
+        if kind == ERR:
+            self.done = True
+            self.session.forget(self.rid)
+            raise PeerError(payload.decode(errors='replace'))
+        if kind == END:
+            self.done = True
+            self.session.forget(self.rid)
+        return kind, payload
+
+    def items(self, timeout=None):
+        # decoded ITEM payloads until END; returns the END payload via StopIteration
+        while True:
+            kind, payload = self.next(timeout)
+            if kind == END:
+                return json.loads(payload) if payload else {}
+            if kind == ITEM:
+                yield json.loads(payload)
+
+    def result(self, timeout=None):
+        # first ITEM (or END) payload, for request/response style ops
+        kind, payload = self.next(timeout)
+        return json.loads(payload) if payload else {}
+
+    def data(self, timeout=None):
+        # raw DATA payloads until END
+        while True:
+            kind, payload = self.next(timeout)
+            if kind == END:
+                return
+            if kind == DATA:
+                yield payload
+
+    def send_data(self, data):
+        self.session.send(pack(self.rid, DATA, data))
+
+    def end(self, obj=None):
+        self.session.send(pack(self.rid, END, obj or {}))
+
+    def cancel(self):
+        # no-op once the call has ended
+        if self.done:
+            return
+        self.done = True
+        self.session.forget(self.rid)
+        try:
+            self.frames.put_nowait((ERR, b"cancelled"))
+        except queue.Full:
+            pass
+        try:
+            self.session.send(pack(self.rid, CANCEL))
+        except OSError:
+            pass
+
+class PeerSession:
+    # one persistent connection to a peer, shared by every search, download and upload
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.next_rid = 1
+        self.last_seen = 0.0
+        self.rtt = None
+        self.ping_sent = None
+
+    def connect(self, timeout=CONNECT_TIMEOUT):
+        with self.lock:
+            if self.sock is not None:
+                return
+            sock = socket.create_connection((self.host, self.port), timeout=timeout)
+            sock.settimeout(None)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+            self.last_seen = time.time()
+        threading.Thread(target=self._reader, args=(sock,), daemon=True).start()
+        threading.Thread(target=self._keepalive, args=(sock,), daemon=True).start()
+
+    @property
+    def alive(self):
+        return self.sock is not None
+
+    def call(self, op, **args):
+        self.connect()
+        with self.lock:
+            rid = self.next_rid
+            self.next_rid += 1
+            call = self.calls[rid] = Call(self, rid)
+        args["op"] = op
+        try:
+            self.send(pack(rid, REQ, args))
+        except OSError:
+            self.close()
+            raise
+        return call
+
+    def send(self, frame):
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError("session closed")
+        with self.send_lock:
+            sock.sendall(frame)
+
+    def forget(self, rid):
+        with self.lock:
+            self.calls.pop(rid, None)
+
+    def _reader(self, sock):
+        try:
+            while True:
+                rid, kind, payload = read_frame(sock)
+                self.last_seen = time.time()
+                if kind == PONG:
+                    if self.ping_sent:
+                        self.rtt = time.time() - self.ping_sent
+                    continue
+                if kind == PING:
+                    self.send(pack(0, PONG))
+                    continue
+                with self.lock:
+                    call = self.calls.get(rid)
+                if call is not None:
+                    call.frames.put((kind, payload))
+        except (OSError, ConnectionError, struct.error):
+            pass
+        finally:
+            self.close(sock)
+
+    def _keepalive(self, sock):
+        while self.sock is sock:
+            time.sleep(KEEPALIVE)
+            if time.time() - self.last_seen > KEEPALIVE * DEAD_AFTER:
+                self.close(sock)
+                return
+            try:
+                self.ping()
+            except OSError:
+                self.close(sock)
+                return
+
+    def ping(self):
+        self.ping_sent = time.time()
+        self.send(pack(0, PING))
+
+    def close(self, sock=None):
+        # fail every pending call so nobody waits forever on a dead peer
+        with self.lock:
+            if sock is not None and sock is not self.sock:
+                return
+            sock, self.sock = self.sock, None
+            calls, self.calls = self.calls, {}
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        for call in calls.values():
+            try:
+                call.frames.put_nowait((ERR, b"connection lost"))
+            except queue.Full:
+                pass
+
+class SessionPool:
+    def __init__(self, port, port_of=None):
+        self.port = port
+        self.port_of = port_of   # host -> port the peer announced, None for the default
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def get(self, host):
+        port = (self.port_of(host) if self.port_of is not None else None) or self.port
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is not None and session.port != port:
+                session.close()   # the peer came back on another port
+                session = None
+            if session is None:
+                session = self.sessions[host] = PeerSession(host, port)
+            return session
+
+    def call(self, host, op, **args):
+        # retry once on a fresh connection if the pooled one went stale
+        session = self.get(host)
+        try:
+            return session.call(op, **args)
+        except OSError:
+            session.close()
+            return session.call(op, **args)
+
+class Request:
+    # server side of one request, handed to the op handler
+    def __init__(self, conn, rid, args):
+        self.conn = conn
+        self.rid = rid
+        self.args = args
+        self.op = args.get("op")
+        self.addr = conn.addr
+        self.inbound = queue.Queue(maxsize=CALL_BACKLOG)
+        self.cancelled = threading.Event()
+        self.parked = False
+
+    def reply(self, obj):
+        self.conn.send(pack(self.rid, ITEM, obj))
+
+    def send_data(self, data):
+        self.conn.send(pack(self.rid, DATA, data))
+
+    def end(self, obj=None):
+        self.conn.send(pack(self.rid, END, obj or {}))
+
+    def error(self, msg):
+        self.conn.send(pack(self.rid, ERR, str(msg).encode()))
+
+    def park(self):
+        # the handler returns without answering; nothing waits on it until resume()
+        self.parked = True
+
+    def resume(self, fn):
+        # continue a parked request with fn(req) on the worker pool
+        self.parked = False
+        self.conn.pool.submit(self.conn._run, self, fn)
+
+    def data(self):
+        # DATA frames the client streams to us (uploads) until its END
+        while True:
+            kind, payload = self.inbound.get()
+            if kind != DATA:
+                return
+            yield payload
+
+class PeerConnection:
+    # serves every request arriving on one accepted socket, on a shared worker pool
+    def __init__(self, sock, addr, handlers, pool):
+        self.sock = sock
+        self.addr = addr
+        self.handlers = handlers
+        self.pool = pool
+        self.send_lock = threading.Lock()
+        self.requests = {}
+        self.state = {}   # per-connection data handlers may keep (e.g. approved roots)
+
+    def send(self, frame):
+        with self.send_lock:
+            try:
+                self.sock.sendall(frame)
+            except OSError as e:
+                raise ConnectionLost(e) from e
+
+    def serve(self):
+        try:
+            while True:
+                rid, kind, payload = read_frame(self.sock)
+                if kind == PING:
+                    self.send(pack(0, PONG))
+                elif kind == REQ:
+                    req = self.requests[rid] = Request(self, rid, json.loads(payload))
+                    self.pool.submit(self._run, req)
+                elif kind in (DATA, END, CANCEL):
+                    req = self.requests.get(rid)
+                    if req is None:
+                        continue
+                    if kind == CANCEL:
+                        req.cancelled.set()
+                    req.inbound.put((kind, payload))
+        except (OSError, ConnectionError, struct.error, ValueError):
+            pass
+        finally:
+            for req in self.requests.values():
+                req.cancelled.set()
+                try:
+                    req.inbound.put_nowait((END, b""))
+                except queue.Full:
+                    pass
+            self.sock.close()
+
+    def _run(self, req, handler=None):
+        handler = handler or self.handlers.get(req.op)
+        try:
+            if handler is None:
+                req.error(f"unknown op {req.op}")
+            else:
+                handler(req)
+        except ConnectionLost:
+            pass   # nobody left to answer
+        except Exception as e:
+            try:
+                req.error(e)
+            except ConnectionLost:
+                pass
+        finally:
+            if not req.parked:
+                self.requests.pop(req.rid, None)
+
+def serve_forever(port, handlers, on_listen=None, workers=32):
+    # accept loop; each connection gets one reader thread, ops run on the pool
+    pool = ThreadPoolExecutor(max_workers=workers)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as srv:
+        srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        srv.bind(("", port))
+        srv.listen()
+        if on_listen:
+            on_listen()
+        while True:
+            sock, addr = srv.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = PeerConnection(sock, addr, handlers, pool)
+            threading.Thread(target=conn.serve, daemon=True).start()
@@ -0,0 +1,72 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+# Pillow is optional; without it peers simply send raw bytes instead of thumbnails
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PREVIEW_BYTES = 16 * 1024        # default head of a file shown in the preview pane
+MAX_PREVIEW_BYTES = 1024 * 1024  # largest range one preview request may ask for
+THUMB_SIZE = (320, 240)
+CACHE_BYTES = 32 * 1024 * 1024
+IMAGE_EXTS = frozenset((".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".tif", ".tiff"))
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTS
+
+def thumbnail(path):
+    # PNG bytes small enough for the preview pane, or None if this peer cannot make one
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as img:
+            img.thumbnail(THUMB_SIZE)
+            if img.mode not in ("RGB", "RGBA", "L", "P"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, "PNG")
+            return out.getvalue()
+    except (OSError, ValueError):
+        return None
+
+def looks_binary(data):
+    return b"\0" in data[:4096]
+
+def hexdump(data, rows=32):
+    lines = []
+    for i in range(0, min(len(data), rows * 16), 16):
+        chunk = data[i:i + 16]
+        text = "".join(chr(b) if 32 <= b < 127 else "." for b in chunk)
+        lines.append(f"{i:08x}  {chunk.hex(' '):<47}  {text}")
+    return "\n".join(lines)
+
+class PreviewCache:
+    # LRU of fetched previews keyed by (peer, path, mtime, what), bounded by total bytes
+    def __init__(self, limit=CACHE_BYTES):
+        self.limit = limit
+        self.used = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        # value is (meta dict, bytes)
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.used -= len(old[1])
+            self.items[key] = value
+            self.used += len(value[1])
+            while self.used > self.limit and len(self.items) > 1:
+                _, (_, data) = self.items.popitem(last=False)
+                self.used -= len(data)
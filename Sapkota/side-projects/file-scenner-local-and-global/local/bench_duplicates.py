@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+from scan_engine import ScanEngine
+from duplicates import DuplicateFinder, reclaimable
+
+# synthetic tree: many files sharing a handful of sizes (as media/archives tend to),
+# with every DUP_EVERY-th file an exact copy of another
+FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+SIZES = (4 * 1024, 200 * 1024, 1024 * 1024, 3 * 1024 * 1024)
+DUP_EVERY = 10
+
+def make_tree(root):
+    for i in range(FILES):
+        d = os.path.join(root, f"d{i % 20}")
+        os.makedirs(d, exist_ok=True)
+        size = SIZES[i % len(SIZES)]
+        seed = i - len(SIZES) if i % DUP_EVERY == 0 and i >= len(SIZES) else i  # same size, same content
+        block = hashlib.sha256(str(seed).encode()).digest() * (size // 32)
+        with open(os.path.join(d, f"f{i}.bin"), "wb") as f:
+            f.write(block[:size])
+
+def bench_naive(records):
+    # what a one-stage finder does: hash every file completely
+    start, read, by_hash = time.perf_counter(), 0, {}
+    for path, size, _ in records:
+        with open(path, "rb") as f:
+            by_hash.setdefault(hashlib.blake2b(f.read(), digest_size=16).digest(), []).append(path)
+        read += size
+    groups = [g for g in by_hash.values() if len(g) > 1]
+    return len(groups), read, time.perf_counter() - start
+
+def bench_staged(records):
+    start = time.perf_counter()
+    finder = DuplicateFinder(records)
+    groups = finder.run()
+    return len(groups), finder.bytes_read, time.perf_counter() - start, reclaimable(groups)
+
+if __name__ == "__main__":
+    root = tempfile.mkdtemp(prefix="dupbench-")
+    try:
+        make_tree(root)
+        records = ScanEngine(root).run()
+        total = sum(r[1] for r in records)
+        print(f"{len(records)} files, {total / 1e6:.1f} MB under {root}")
+        groups, read, t = bench_naive(records)
+        print(f"hash everything: {groups:5d} groups  read {read / 1e6:8.1f} MB  {t:6.2f} s")
+        groups, read, t, saved = bench_staged(records)
+        print(f"staged         : {groups:5d} groups  read {read / 1e6:8.1f} MB  {t:6.2f} s  "
+              f"({saved / 1e6:.1f} MB reclaimable)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+from content_search import ContentSearch, grep_file
+
+# synthetic logs: FILES files of LINES lines each, with a rare hit near the end of every file
+FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+LINES = int(sys.argv[2]) if len(sys.argv) > 2 else 400000
+NEEDLE = "connection reset"
+
+def make_logs(root):
+    for i in range(FILES):
+        with open(os.path.join(root, f"app{i}.log"), "w") as f:
+            for n in range(LINES):
+                if n == LINES - 10:
+                    f.write(f"2024-01-01 12:00:{n % 60:02d} ERROR worker {i}: Connection reset by peer\n")
+                else:
+                    f.write(f"2024-01-01 12:00:{n % 60:02d} INFO worker {i}: request {n} served in {n % 97} ms\n")
+
+def bench_readlines(records):
+    # the simple way: decode every line and test it in Python
+    start, hits = time.perf_counter(), 0
+    for path, _, _ in records:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            hits += sum(1 for line in f if NEEDLE in line.lower())
+    return hits, time.perf_counter() - start
+
+def bench_pool(records, workers):
+    start = time.perf_counter()
+    search = ContentSearch(records, NEEDLE, {".log"}, workers=workers)
+    hits = sum(len(h) for _, _, _, h in search.results())
+    return hits, time.perf_counter() - start
+
+if __name__ == "__main__":
+    root = tempfile.mkdtemp(prefix="grepbench-")
+    try:
+        make_logs(root)
+        records = []
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            records.append((path, st.st_size, st.st_mtime))
+        total = sum(r[1] for r in records)
+        print(f"{len(records)} files, {total / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+        grep_file(records[0][0], NEEDLE)  # warm the page cache the same way for everyone
+        hits, t = bench_readlines(records)
+        print(f"readlines      : {hits:4d} hits  {t:6.2f} s  {total / 1e6 / t:7.1f} MB/s")
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            hits, t = bench_pool(records, workers)
+            print(f"mmap x{workers:<2d} procs : {hits:4d} hits  {t:6.2f} s  {total / 1e6 / t:7.1f} MB/s")
+            workers *= 2
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
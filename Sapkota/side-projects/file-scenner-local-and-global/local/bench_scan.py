@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+from scan_engine import ScanEngine, name_matcher
+from catalog import Catalog
+
+# synthetic tree: FILES files spread over directories DEPTH levels deep, FANOUT subdirs each
+FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+FANOUT = 8
+DEPTH = 4
+
+def make_tree(root):
+    dirs = [root]
+    for _ in range(DEPTH):
+        dirs = [os.path.join(d, f"d{i}") for d in dirs for i in range(FANOUT)]
+    for d in dirs:
+        os.makedirs(d, exist_ok=True)
+    for i in range(FILES):
+        with open(os.path.join(dirs[i % len(dirs)], f"file{i}.txt" if i % 3 else f"img{i}.jpg"), "wb") as f:
+            f.write(b"x" * (i % 64))
+    return len(dirs)
+
+def bench_old(root):
+    # what test.py did, minus its sleeps: os.walk plus a getsize per file
+    start, found = time.perf_counter(), 0
+    for root_dir, dirs, files in os.walk(root):
+        for fname in files:
+            if "img" in fname.lower():
+                os.path.getsize(os.path.join(root_dir, fname))
+                found += 1
+    return found, time.perf_counter() - start
+
+def bench_engine(root, workers):
+    start = time.perf_counter()
+    found = len(ScanEngine(root, match=name_matcher("img"), workers=workers).run())
+    return found, time.perf_counter() - start
+
+def bench_catalog(root, catalog):
+    start = time.perf_counter()
+    found = sum(len(b) for b in catalog.scan(root, name_matcher("img")).start().batches())
+    return found, time.perf_counter() - start
+
+if __name__ == "__main__":
+    root = tempfile.mkdtemp(prefix="scanbench-")
+    try:
+        dirs = make_tree(root)
+        print(f"{FILES} files in {dirs} leaf dirs under {root}")
+        matches, base = bench_old(root)
+        print(f"os.walk + getsize : {matches:8d} matches  {base:6.2f} s")
+        for workers in (1, 4, 16, 32):
+            found, t = bench_engine(root, workers)
+            print(f"engine {workers:2d} workers : {found:8d} matches  {t:6.2f} s  x{base / max(t, 1e-9):.1f}")
+        catalog = Catalog(os.path.join(root, "catalog.db"))
+        for label in ("catalog, first", "catalog, repeat"):
+            found, t = bench_catalog(os.path.join(root, "d0"), catalog)
+            print(f"{label:18s}: {found:8d} matches  {t:6.2f} s  (subtree d0)")
+        # the old loops also slept 10 ms per folder and 20 ms per shown file
+        print(f"(test.py's sleeps alone: {dirs * 0.01 + matches * 0.02:.0f} s)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
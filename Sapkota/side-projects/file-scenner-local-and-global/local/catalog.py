@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import threading
+import time
+from scan_engine import ScanEngine
+
+CATALOG_PATH = os.path.join(os.path.expanduser("~"), ".file_scanner_catalog.db")
+QUERY_BATCH = 2000     # matches handed to the consumer at once
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    dir INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+"""
+
+class Catalog:
+    # every directory ever scanned, with its mtime and the files it held at the time
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self.lock = threading.Lock()   # one refresh writes at a time
+        db = self.connect()
+        db.executescript(SCHEMA)
+        db.close()
+
+    def connect(self):
+        # sqlite connections stay on the thread that made them, so each scan opens its own
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def scan(self, root, match=None, **options):
+        # drop-in for ScanEngine: same start/batches/cancel and counters
+        return CatalogScan(self, root, match, **options)
+
+def under(db, root):
+    # (id, path, mtime) of root and every catalogued directory below it
+    prefix = root if root.endswith(os.sep) else root + os.sep
+    return db.execute("SELECT id, path, mtime FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?",
+                      (root, len(prefix), prefix))
+
+class CatalogScan(ScanEngine):
+    # Incremental walk: every directory is stat'ed, but only those whose mtime moved
+    # (or that are new) are listed again; the rest reuse their catalogued entries.
+    # Matches stream out as workers report folders, like a plain ScanEngine walk.
+    # A directory's mtime changes when entries are added, removed or renamed in it,
+    # not when a file inside is rewritten in place, so such size changes show up on
+    # the next full=True refresh only.
+    def __init__(self, catalog, root, match=None, full=False, **options):
+        super().__init__(root, match=None, **options)
+        self.catalog = catalog
+        self.root = self.roots[0] = os.path.normpath(root)
+        self.name_match = match
+        self.full = full
+        self.known = {}      # path -> (id, mtime) as catalogued before this refresh
+        self.children = {}   # path -> [subdir paths] as catalogued
+        self.visited = set()
+        self.dirs_listed = 0
+
+    @property
+    def expected_dirs(self):
+        # directories catalogued under root last time, for progress estimates
+        return len(self.known) or None
+
+    def _depth(self, path):
+        if path == self.root:
+            return 0
+        prefix = self.root if self.root.endswith(os.sep) else self.root + os.sep
+        return path[len(prefix):].count(os.sep) + 1
+
+    def start(self):
+        self.db = self.catalog.connect()
+        for did, path, mtime in under(self.db, self.root):
+            if self.max_depth is not None and self._depth(path) > self.max_depth:
+                continue   # out of reach for this walk, so neither expected nor pruned
+            self.known[path] = (did, mtime)
+            self.children.setdefault(os.path.dirname(path), []).append(path)
+        return super().start()
+
+    def _scan_dir(self, i, path, depth, batch):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            with self.lock:
+                self.errors += 1
+            return
+        with self.lock:
+            self.visited.add(path)
+            self.dirs_scanned += 1
+        descend = self.max_depth is None or depth < self.max_depth
+        old = self.known.get(path)
+        if old is not None and old[1] == mtime and not self.full:
+            batch.append((path, mtime, None))   # files come from the catalog on the consumer side
+            if descend:
+                subdirs = [d for d in self.children.get(path, ())
+                           if self.exclude is None or not self.exclude.match(os.path.basename(d))]
+                self._push(i, subdirs, depth + 1)
+            return
+        files, subdirs = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if self.exclude is not None and self.exclude.match(entry.name):
+                        continue
+                    try:
+                        link = entry.is_symlink()
+                        if link and self.symlinks == "skip":
+                            continue
+                        if entry.is_dir(follow_symlinks=not link or self.symlinks == "follow"):
+                            if descend:
+                                subdirs.append(entry.path)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            files.append((entry.name, st.st_size, st.st_mtime))
+                    except OSError:
+                        continue
+        except OSError:
+            with self.lock:
+                self.errors += 1
+            return
+        with self.lock:
+            self.dirs_listed += 1
+            self.files_seen += len(files)
+        batch.append((path, mtime, files))
+        self._push(i, subdirs, depth + 1)
+
+    def batches(self):
+        # apply directory changes as workers report them and hand out the matches straight
+        # away: listed folders from what was just read, unchanged ones from the catalog
+        try:
+            with self.catalog.lock:
+                for changes in super().batches():
+                    found = self._apply(changes)
+                    for k in range(0, len(found), QUERY_BATCH):
+                        if self.stop.is_set():
+                            break
+                        yield found[k:k + QUERY_BATCH]
+                if not self.stop.is_set():
+                    self._prune()
+                self.db.commit()
+        finally:
+            self.db.close()
+            self.finished = time.time()
+
+    def _apply(self, changes):
+        # record listed folders, and return the matching files of every folder in changes
+        db, found = self.db, []
+        for path, mtime, files in changes:
+            if files is None:
+                # looked up by path, not self.known: a superseded scan may have committed since
+                files = db.execute("SELECT f.name, f.size, f.mtime FROM files f JOIN dirs d ON f.dir = d.id "
+                                   "WHERE d.path = ?", (path,)).fetchall()
+                self._collect(path, files, found)
+                continue
+            # upsert rather than trust self.known, for the same reason
+            db.execute("INSERT INTO dirs (path, mtime) VALUES (?, ?) "
+                       "ON CONFLICT (path) DO UPDATE SET mtime = excluded.mtime", (path, mtime))
+            did = db.execute("SELECT id FROM dirs WHERE path = ?", (path,)).fetchone()[0]
+            db.execute("DELETE FROM files WHERE dir = ?", (did,))
+            db.executemany("INSERT OR REPLACE INTO files (dir, name, size, mtime) VALUES (?, ?, ?, ?)",
+                           [(did, name, size, fmtime) for name, size, fmtime in files])
+            self._collect(path, files, found)
+        return found
+
+    def _collect(self, path, files, found):
+        match = self.name_match
+        for name, size, mtime in files:
+            if match is not None and not match(name):
+                continue
+            if self.exclude is not None and self.exclude.match(name):
+                continue
+            found.append((os.path.join(path, name), size, mtime))
+            self.files_matched += 1
+            self.bytes_matched += size
+
+    def _prune(self):
+        # catalogued directories the walk no longer reached are gone (or now excluded);
+        # known only holds those within max_depth, so a shallow walk prunes nothing deeper
+        gone = [did for path, (did, _) in self.known.items() if path not in self.visited]
+        for k in range(0, len(gone), 500):
+            ids = gone[k:k + 500]
+            marks = ",".join("?" * len(ids))
+            self.db.execute(f"DELETE FROM files WHERE dir IN ({marks})", ids)
+            self.db.execute(f"DELETE FROM dirs WHERE id IN ({marks})", ids)
@@ -0,0 +1,119 @@
+import os
+import re
+import mmap
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+WORKERS = os.cpu_count() or 1
+SNIFF_BYTES = 8192          # a NUL in here means binary, skip the file
+MAX_HITS_PER_FILE = 100
+MAX_LINE = 200              # characters of context kept per hit
+COUNT_STEP = 16 * 1024 * 1024
+
+def _count_lines(view, start, end):
+    # newlines in view[start:end], a slice at a time so GB-sized gaps never get copied at once
+    n = 0
+    for pos in range(start, end, COUNT_STEP):
+        n += view[pos:min(pos + COUNT_STEP, end)].count(b"\n")
+    return n
+
+def grep_file(path, pattern, ignore_case=True, literal=True, max_hits=MAX_HITS_PER_FILE):
+    # [(line number, line text)] for one file; runs in a worker process.
+    # The file is mmap'd, so a multi-GB log is searched without being read into memory.
+    try:
+        with open(path, "rb") as f:
+            if b"\0" in f.read(SNIFF_BYTES):
+                return []
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return _search(m, pattern, ignore_case, literal, max_hits)
+    except (OSError, ValueError):
+        return []
+
+def _search(m, pattern, ignore_case, literal, max_hits):
+    needle = pattern.encode("utf-8")
+    if literal:
+        # plain bytes find stays in C; an IGNORECASE regex is several times slower than
+        # lowering a chunk and searching that
+        if ignore_case:
+            needle = needle.lower()
+        def matches():
+            size, pos = len(m), 0
+            while pos < size:
+                end = min(pos + COUNT_STEP, size)
+                chunk = m[pos:min(end + len(needle) - 1, size)]
+                if ignore_case:
+                    chunk = chunk.lower()
+                at = chunk.find(needle)
+                while at != -1 and pos + at < end:
+                    yield pos + at
+                    at = chunk.find(needle, at + 1)
+                pos = end
+    else:
+        rx = re.compile(needle, re.IGNORECASE if ignore_case else 0)
+        matches = lambda: (mo.start() for mo in rx.finditer(m))
+    hits, line, counted, last_line_end = [], 1, 0, -1
+    for pos in matches():
+        if pos < last_line_end:
+            continue  # one hit per line is enough
+        line += _count_lines(m, counted, pos)
+        counted = pos
+        start = m.rfind(b"\n", 0, pos) + 1
+        end = m.find(b"\n", pos)
+        if end == -1:
+            end = len(m)
+        text = m[start:min(end, start + MAX_LINE * 4)].decode("utf-8", errors="replace").rstrip("\r")
+        hits.append((line, text[:MAX_LINE]))
+        last_line_end = end
+        if len(hits) >= max_hits:
+            break
+    return hits
+
+class ContentSearch:
+    # fans files out over a process pool and yields (path, size, mtime, hits) as each finishes
+    def __init__(self, records, pattern, exts, ignore_case=True, literal=True, workers=WORKERS):
+        self.records = records      # iterable of (path, size, mtime)
+        self.pattern = pattern
+        self.exts = exts
+        self.ignore_case = ignore_case
+        self.literal = literal
+        self.workers = workers
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.files_searched = 0
+        self.bytes_searched = 0
+        self.files_matched = 0
+
+    def cancel(self):
+        self.stop.set()
+
+    def results(self):
+        window = self.workers * 4   # files in flight; keeps memory flat on huge trees
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            running = {}
+            records = iter(self.records)
+            while not self.stop.is_set():
+                while len(running) < window:
+                    rec = next(records, None)
+                    if rec is None:
+                        break
+                    if os.path.splitext(rec[0])[1].lower() not in self.exts:
+                        continue
+                    fut = pool.submit(grep_file, rec[0], self.pattern, self.ignore_case, self.literal)
+                    running[fut] = rec
+                if not running:
+                    return
+                done, _ = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    path, size, mtime = running.pop(fut)[:3]
+                    hits = fut.result()
+                    with self.lock:
+                        self.files_searched += 1
+                        self.bytes_searched += size
+                        self.files_matched += bool(hits)
+                    if hits:
+                        yield path, size, mtime, hits
+            for fut in running:
+                fut.cancel()
@@ -0,0 +1,232 @@
+import os
+import threading
+from array import array
+from scan_engine import ScanEngine
+
+CLUSTER = 4096   # allocation unit assumed where st_blocks is missing (Windows)
+
+def allocated(st):
+    # bytes really used on disk: st_blocks is in 512-byte units wherever it exists
+    blocks = getattr(st, "st_blocks", None)
+    if blocks is not None:
+        return blocks * 512
+    return -(-st.st_size // CLUSTER) * CLUSTER
+
+def stamp(st):
+    # what a file adds to its folder; negative for a hard-linked file, so gaining or
+    # losing a link shows up as a change too
+    size = allocated(st)
+    return -size - 1 if st.st_nlink > 1 else size
+
+class DirNode:
+    # own_* covers files directly in the folder, the rest includes every subfolder
+    __slots__ = ("path", "mtime", "children", "links", "files", "stamps",
+                 "own_bytes", "own_files", "own_cats",
+                 "total_bytes", "total_files", "cats")
+
+    def __init__(self, path, mtime, ncats):
+        self.path = path
+        self.mtime = mtime
+        self.children = []              # subfolder paths
+        self.links = ()                 # ((dev, ino), bytes) of hard-linked files in this folder
+        self.files = ()                 # names of the files counted here
+        self.stamps = array('q')        # stamp() of each of them at the last listing
+        self.own_bytes = 0
+        self.own_files = 0
+        self.own_cats = array('I', bytes(4 * ncats))   # file count per category
+        self.total_bytes = 0
+        self.total_files = 0
+        self.cats = array('I', bytes(4 * ncats))
+
+    @property
+    def name(self):
+        return os.path.basename(self.path.rstrip("\\/")) or self.path
+
+class UsageScan(ScanEngine):
+    # one walk over the pool; a folder keeps its old node when its mtime is unchanged and
+    # none of its files changed size (a write or append leaves the folder mtime alone).
+    # full=True re-lists every folder.
+    def __init__(self, usage, root, full=False, **options):
+        options.pop("max_depth", None)   # totals need the whole subtree
+        super().__init__(root, **options)
+        self.usage = usage
+        self.full = full
+        self.changed = []
+
+    def _unchanged(self, path, old):
+        # one stat per known file, still much cheaper than listing and classifying again
+        for name, was in zip(old.files, old.stamps):
+            try:
+                st = os.stat(os.path.join(path, name), follow_symlinks=False)
+            except OSError:
+                return False
+            if stamp(st) != was:
+                return False
+        return True
+
+    @property
+    def expected_dirs(self):
+        # folders known from earlier refreshes, for progress estimates
+        return len(self.usage.nodes) or None
+
+    def _scan_dir(self, i, path, depth, batch):
+        usage = self.usage
+        try:
+            dst = os.stat(path)
+        except OSError:
+            with self.lock:
+                self.errors += 1
+            return
+        mtime = dst.st_mtime
+        old = usage.nodes.get(path)
+        with self.lock:
+            self.dirs_scanned += 1
+            usage.visited.add(path)
+        if old is not None and old.mtime == mtime and not self.full and self._unchanged(path, old):
+            self._push(i, [d for d in old.children
+                           if self.exclude is None or not self.exclude.match(os.path.basename(d))], depth + 1)
+            return
+        node = DirNode(path, mtime, len(usage.categories))
+        node.own_bytes = allocated(dst)   # the folder's own entry blocks, as du counts them
+        links, files, stamps = [], [], array('q')
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if self.exclude is not None and self.exclude.match(entry.name):
+                        continue
+                    try:
+                        if entry.is_symlink():
+                            continue   # a link takes no space worth counting and may point anywhere
+                        if entry.is_dir(follow_symlinks=False):
+                            node.children.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    node.own_files += 1
+                    files.append(entry.name)
+                    stamps.append(stamp(st))
+                    node.own_cats[usage.category(entry.name)] += 1
+                    if st.st_nlink > 1 and st.st_ino:
+                        links.append(((st.st_dev, st.st_ino), allocated(st)))
+                    else:
+                        node.own_bytes += allocated(st)
+        except OSError:
+            with self.lock:
+                self.errors += 1
+            return
+        with usage.lock:
+            if old is not None:
+                usage.release(old)
+            # a hard-linked file counts once, in whichever folder claimed it first
+            for key, size in links:
+                usage.holders.setdefault(key, set()).add(path)
+                if key not in usage.owners:
+                    usage.owners[key] = path
+                    node.own_bytes += size
+            node.links = tuple(links)
+            node.files = tuple(files)
+            node.stamps = stamps
+            usage.nodes[path] = node
+        with self.lock:
+            self.files_seen += node.own_files
+            self.changed.append(path)
+        self._push(i, node.children, depth + 1)
+
+class DiskUsage:
+    # du-style totals for a tree, kept between scans so a rescan only re-lists changed folders
+    def __init__(self, categories):
+        # categories: {"Photos": [".jpg", ...], ...}; anything unmatched counts as "Other"
+        self.categories = [name for name, exts in categories.items() if exts] + ["Other"]
+        self.by_ext = {ext: i for i, (name, exts) in enumerate((n, e) for n, e in categories.items() if e)
+                       for ext in exts}
+        self.lock = threading.Lock()
+        self.refreshing = threading.Lock()   # a superseded refresh finishes before the next starts
+        self.nodes = {}      # folder path -> DirNode
+        self.owners = {}     # (dev, ino) -> folder whose total includes that hard-linked file
+        self.holders = {}    # (dev, ino) -> every folder with a link to it
+        self.moved = set()   # folders that took over a hard link from a released one
+        self.stale = set()   # re-listed by a cancelled refresh, totals still to redo
+        self.visited = set()
+        self.scan = None
+
+    def category(self, name):
+        return self.by_ext.get(os.path.splitext(name)[1].lower(), len(self.categories) - 1)
+
+    def release(self, node):
+        # forget a folder's hard links; one it counted passes to another folder that has it
+        for key, size in node.links:
+            holders = self.holders.get(key, set())
+            holders.discard(node.path)
+            if not holders:
+                self.holders.pop(key, None)
+            if self.owners.get(key) != node.path:
+                continue
+            del self.owners[key]
+            heir = next((p for p in holders if p in self.nodes and self.nodes[p] is not node), None)
+            if heir is not None:
+                self.owners[key] = heir
+                self.nodes[heir].own_bytes += size
+                self.moved.add(heir)
+
+    def refresh(self, root, full=False, **options):
+        # walk (incrementally after the first time, unless full), then re-add only the
+        # dirty folders; returns the root node
+        with self.refreshing:
+            return self._refresh(os.path.normpath(root), full, options)
+
+    def _refresh(self, root, full, options):
+        self.visited = set()
+        self.moved = set()
+        self.scan = UsageScan(self, root, full=full, **options)
+        self.scan.run()
+        self.stale.update(self.scan.changed)
+        self.stale.update(self.moved)
+        if self.scan.stop.is_set():
+            return self.nodes.get(root)
+        dirty, self.stale = self.stale, set()
+        prefix = root if root.endswith(os.sep) else root + os.sep
+        for path in [p for p in self.nodes if (p == root or p.startswith(prefix)) and p not in self.visited]:
+            self.release(self.nodes.pop(path))
+            dirty.add(os.path.dirname(path))
+        # every ancestor of a changed folder needs its totals redone, nothing else does
+        for path in list(dirty):
+            while path != root and path.startswith(prefix):
+                path = os.path.dirname(path)
+                if path in dirty:
+                    break
+                dirty.add(path)
+        for path in sorted((p for p in dirty if p in self.nodes), key=lambda p: p.count(os.sep), reverse=True):
+            self._total(self.nodes[path])
+        return self.nodes.get(root)
+
+    def _total(self, node):
+        node.total_bytes = node.own_bytes
+        node.total_files = node.own_files
+        cats = array('I', node.own_cats)
+        for child in node.children:
+            sub = self.nodes.get(child)
+            if sub is None:
+                continue
+            node.total_bytes += sub.total_bytes
+            node.total_files += sub.total_files
+            for k, n in enumerate(sub.cats):
+                cats[k] += n
+        node.cats = cats
+
+    def children(self, path):
+        # subfolders of one folder, biggest first: what a drill-down or treemap level needs
+        node = self.nodes.get(path)
+        if node is None:
+            return []
+        subs = [self.nodes[c] for c in node.children if c in self.nodes]
+        subs.sort(key=lambda n: n.total_bytes, reverse=True)
+        return subs
+
+def human(n):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1024 or unit == "TB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
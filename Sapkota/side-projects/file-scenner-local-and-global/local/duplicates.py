@@ -0,0 +1,126 @@
+import os
+import mmap
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+EDGE = 64 * 1024          # bytes hashed from each end in the cheap stage
+CHUNK = 8 * 1024 * 1024   # full-hash step, so huge files never sit in memory at once
+WORKERS = min(16, (os.cpu_count() or 1) * 2)  # hashlib drops the GIL, threads are enough
+
+def _digest():
+    return hashlib.blake2b(digest_size=16)
+
+def _hash_view(h, view, start, end):
+    for pos in range(start, end, CHUNK):
+        h.update(view[pos:min(pos + CHUNK, end)])
+
+class DuplicateFinder:
+    # size -> head/tail hash -> full hash; each stage only looks at what the last one left
+    def __init__(self, records, min_size=1, workers=WORKERS):
+        self.records = records      # iterable of (path, size, ...) from a scan
+        self.min_size = min_size
+        self.workers = workers
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.stage = ""
+        self.files_hashed = 0
+        self.bytes_read = 0
+        self.candidates = 0
+
+    def cancel(self):
+        self.stop.set()
+
+    def run(self):
+        # [(size, [paths])] of identical files, most reclaimable space first
+        self.stage = "size"
+        by_size = {}
+        for rec in self.records:
+            if rec[1] >= self.min_size:
+                by_size.setdefault(rec[1], []).append(rec[0])
+        if self.stop.is_set():
+            return []
+        # the scanned sizes can be stale (a catalog keeps them until the folder changes),
+        # so the candidates are grouped again by what they measure now
+        fresh = self._distinct([p for paths in by_size.values() if len(paths) > 1 for p in paths])
+        groups = [(size, paths) for size, paths in fresh.items() if len(paths) > 1 and size >= self.min_size]
+        self.candidates = sum(len(p) for _, p in groups)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self.stage = "head/tail"
+            groups = self._split(pool, groups, self._edge_hash)
+            # files no bigger than both edges were already hashed whole
+            small = [(s, p) for s, p in groups if s <= 2 * EDGE]
+            self.stage = "full"
+            groups = small + self._split(pool, [(s, p) for s, p in groups if s > 2 * EDGE], self._full_hash)
+        self.stage = "done"
+        groups.sort(key=lambda g: g[0] * (len(g[1]) - 1), reverse=True)
+        return groups
+
+    def _distinct(self, paths):
+        # current size -> paths; hard links are one file on disk, so one path per (device, inode)
+        seen, by_size = set(), {}
+        for p in paths:
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            if st.st_ino and key in seen:
+                continue
+            seen.add(key)
+            by_size.setdefault(st.st_size, []).append(p)
+        return by_size
+
+    def _split(self, pool, groups, hasher):
+        out = []
+        jobs = [(size, paths, [pool.submit(hasher, p, size) for p in paths]) for size, paths in groups]
+        for size, paths, futures in jobs:
+            by_hash = {}
+            for p, f in zip(paths, futures):
+                digest = f.result()
+                if digest is not None:
+                    by_hash.setdefault(digest, []).append(p)
+            out.extend((size, same) for same in by_hash.values() if len(same) > 1)
+        return out
+
+    def _read(self, path, size, ranges):
+        # hash the given byte ranges through an mmap, falling back to plain reads
+        if self.stop.is_set():
+            return None
+        h = _digest()
+        try:
+            with open(path, "rb") as f:
+                try:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                        if len(m) != size:
+                            return None  # changed since the scan
+                        with memoryview(m) as view:  # slices of a view are not copies
+                            for start, end in ranges:
+                                _hash_view(h, view, start, end)
+                except (ValueError, OverflowError, OSError):
+                    for start, end in ranges:
+                        f.seek(start)
+                        left = end - start
+                        while left > 0:
+                            data = f.read(min(CHUNK, left))
+                            if not data:
+                                return None
+                            h.update(data)
+                            left -= len(data)
+        except OSError:
+            return None
+        with self.lock:
+            self.files_hashed += 1
+            self.bytes_read += sum(end - start for start, end in ranges)
+        return h.digest()
+
+    def _edge_hash(self, path, size):
+        if size <= 2 * EDGE:
+            return self._read(path, size, [(0, size)])
+        return self._read(path, size, [(0, EDGE), (size - EDGE, size)])
+
+    def _full_hash(self, path, size):
+        return self._read(path, size, [(0, size)])
+
+def reclaimable(groups):
+    return sum(size * (len(paths) - 1) for size, paths in groups)
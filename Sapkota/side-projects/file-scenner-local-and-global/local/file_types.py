@@ -1,4 +1,8 @@
 # file_types.py
+import os
+import json
+import sqlite3
+import threading
 
 FILE_TYPES = {
     "All": None,
@@ -11,3 +15,181 @@ FILE_TYPES = {
     "Archives": ['.zip', '.rar', '.7z', '.tar', '.gz'],
     "Executables": ['.exe', '.msi', '.bin', '.app']
 }
+
+# Files the preview pane and content search treat as text
+TEXT_EXTS = frozenset(['.txt', '.py', '.bat', '.log', '.csv', '.json', '.md'])
+
+# Extensions that say little about the contents; these files get their magic bytes read
+AMBIGUOUS_EXTS = frozenset(['', '.bin', '.dat', '.tmp', '.part', '.download', '.crdownload'])
+
+# (offset, leading bytes, category) checked in order, first hit wins
+MAGIC = [
+    (0, b"\xff\xd8\xff", "Photos"),
+    (0, b"\x89PNG\r\n\x1a\n", "Photos"),
+    (0, b"GIF87a", "Photos"),
+    (0, b"GIF89a", "Photos"),
+    (0, b"BM", "Photos"),
+    (0, b"II*\x00", "Photos"),
+    (0, b"MM\x00*", "Photos"),
+    (8, b"WEBP", "Photos"),
+    (8, b"AVI ", "Videos"),
+    (4, b"ftyp", "Videos"),
+    (0, b"\x1a\x45\xdf\xa3", "Videos"),
+    (0, b"FLV", "Videos"),
+    (0, b"%PDF", "Documents"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "Documents"),  # old Office files
+    (8, b"WAVE", "Audio"),
+    (0, b"ID3", "Audio"),
+    (0, b"\xff\xfb", "Audio"),
+    (0, b"fLaC", "Audio"),
+    (0, b"OggS", "Audio"),
+    (0, b"PK\x03\x04", "Archives"),
+    (0, b"Rar!\x1a\x07", "Archives"),
+    (0, b"7z\xbc\xaf\x27\x1c", "Archives"),
+    (0, b"\x1f\x8b", "Archives"),
+    (257, b"ustar", "Archives"),
+    (0, b"MZ", "Executables"),
+    (0, b"\x7fELF", "Executables"),
+]
+SNIFF_BYTES = 512   # enough for every offset above
+
+# User categories: {"Name": [".ext", ...]} or {"Name": {"exts": [...], "magic": [[offset, "hex"], ...]}}
+USER_TYPES_PATH = os.path.join(os.path.expanduser("~"), ".file_scanner_types.json")
+TYPES_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".file_scanner_types.db")
+
+def add_category(name, exts=(), magic=()):
+    # new category, or more extensions/signatures for an existing one
+    known = FILE_TYPES.get(name) or []
+    FILE_TYPES[name] = known + [e.lower() for e in exts if e.lower() not in known]
+    for offset, head in magic:
+        MAGIC.insert(0, (offset, head, name))   # user signatures win over the built-in ones
+
+def load_user_types(path=USER_TYPES_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            types = json.load(f)
+    except (OSError, ValueError):
+        return
+    for name, spec in types.items():
+        if isinstance(spec, dict):
+            add_category(name, spec.get("exts", ()),
+                         [(offset, bytes.fromhex(head)) for offset, head in spec.get("magic", ())])
+        else:
+            add_category(name, spec)
+
+load_user_types()
+
+class Classifier:
+    # Category of a file: the extension decides when it is known and says enough,
+    # otherwise the magic bytes do. Sniffed answers are kept in SQLite keyed by
+    # device+inode and mtime, so a rescan only reads files that changed.
+    def __init__(self, types=None, cache_path=TYPES_CACHE_PATH):
+        types = FILE_TYPES if types is None else types
+        self.categories = [name for name, exts in types.items() if exts] + ["Other"]
+        self.other = len(self.categories) - 1
+        self.index = {name: i for i, name in enumerate(self.categories)}
+        self.by_ext = {}
+        for name, exts in types.items():
+            for ext in exts or ():
+                self.by_ext.setdefault(ext, self.index[name])
+        self.magic = [(offset, head, self.index[name]) for offset, head, name in MAGIC if name in self.index]
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.sniffed = 0
+        db = self.connect()
+        db.execute("CREATE TABLE IF NOT EXISTS kinds (dev INTEGER, ino INTEGER, mtime INTEGER, "
+                   "category TEXT NOT NULL, PRIMARY KEY (dev, ino)) WITHOUT ROWID")
+        db.close()
+
+    def connect(self):
+        db = sqlite3.connect(self.cache_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def ext_category(self, name):
+        # category from the name alone, or None when the contents have to be checked
+        ext = os.path.splitext(name)[1].lower()
+        if ext in AMBIGUOUS_EXTS:
+            return None
+        cat = self.by_ext.get(ext)
+        if cat is None and ext in TEXT_EXTS:
+            return self.other   # plain text, nothing to sniff for
+        return cat
+
+    def sniff(self, path, fallback):
+        try:
+            with open(path, "rb") as f:
+                head = f.read(SNIFF_BYTES)
+        except OSError:
+            return fallback
+        with self.lock:
+            self.sniffed += 1
+        for offset, magic, cat in self.magic:
+            if head.startswith(magic, offset):
+                return cat
+        return fallback
+
+    def category(self, path, db=None):
+        cat = self.ext_category(path)
+        if cat is not None:
+            return cat
+        fallback = self.by_ext.get(os.path.splitext(path)[1].lower(), self.other)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return fallback
+        key = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        own = db is None
+        if own:
+            db = self.connect()
+        try:
+            row = db.execute("SELECT category FROM kinds WHERE dev = ? AND ino = ? AND mtime = ?", key).fetchone()
+            if row is not None and row[0] in self.index:
+                return self.index[row[0]]
+            cat = self.sniff(path, fallback)
+            if st.st_ino:
+                db.execute("INSERT OR REPLACE INTO kinds (dev, ino, mtime, category) VALUES (?, ?, ?, ?)",
+                           key + (self.categories[cat],))
+            return cat
+        finally:
+            if own:
+                db.commit()
+                db.close()
+
+    def matcher(self, search, category):
+        # name test for the scan engine: rejects only what the extension already rules out
+        search = search.strip().lower()
+        any_name = search in ("", "all")
+        want = self.index.get(category)
+
+        def match(name):
+            lower = name.lower()
+            if want is not None:
+                cat = self.ext_category(lower)
+                if cat is not None and cat != want:
+                    return False
+            return any_name or search in lower
+        return match
+
+    def select(self, batch, category):
+        # the records of a scan batch that really are in category; only names
+        # the matcher let through on doubt are looked up or sniffed
+        want = self.index.get(category)
+        if want is None:
+            return batch
+        out, db = [], None
+        try:
+            for rec in batch:
+                cat = self.ext_category(rec[0])
+                if cat is None:
+                    if db is None:
+                        db = self.connect()
+                    cat = self.category(rec[0], db)
+                if cat == want:
+                    out.append(rec)
+        finally:
+            if db is not None:
+                db.commit()
+                db.close()
+        return out
@@ -1,8 +1,22 @@
 import os
+import re
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, filedialog
-from file_types import FILE_TYPES
+from file_types import FILE_TYPES, TEXT_EXTS, Classifier
+from scan_engine import name_matcher
+from catalog import Catalog
+from duplicates import DuplicateFinder, reclaimable
+from disk_usage import DiskUsage, human
+from content_search import ContentSearch
+from ui_feed import ListboxFeed
+from result_store import ResultStore, NO_RECORD
+from progress import ScanProgress
+
+# scan options
+SCAN_DEPTH = None        # None = unlimited, 0 = only the chosen folder
+SCAN_EXCLUDE = ("$Recycle.Bin", "System Volume Information", ".git", "__pycache__", "node_modules")
+SCAN_SYMLINKS = "files"  # "skip", "files" (never descend into linked dirs) or "follow"
 
 class FileScannerApp:
     def __init__(self, root):
@@ -12,9 +26,20 @@ class FileScannerApp:
         self.root.config(bg="#1e1e2f")
         
         self.stop_scanning = threading.Event()
-        self.files = []
+        self.results = ResultStore()  # listbox row -> (path, size, mtime, category)
+        self.engine = None
+        self.finder = None
+        self.grep = None
+        self.types = Classifier()  # extension first, magic bytes when the extension says too little
+        self.catalog = Catalog()  # repeat scans only re-list folders that changed
+        self.usage = DiskUsage(FILE_TYPES)  # folder totals, kept so a rescan only redoes what changed
+        self.usage_rows = []                # listbox row -> folder path in the usage view
+        self.mode = "files"
         
         self.create_widgets()
+        self.feed = ListboxFeed(self.root, self.result_listbox)
+        self.progress = ScanProgress(self.root, self.progress_label)
+        self.scan_epoch = 0
         
         # Set default directory to C:\
         default_dir = "C:\\"
@@ -60,6 +85,32 @@ class FileScannerApp:
         self.stop_btn.place(x=580, y=75)
         self.stop_btn.config(state="disabled")
         
+        self.dup_btn = tk.Button(self.root, text="Duplicates", command=lambda: self.start_scan("duplicates"),
+                                 bg="#3e3e5e", fg="white")
+        self.dup_btn.place(x=490, y=75)
+        
+        self.usage_btn = tk.Button(self.root, text="Disk Usage", command=lambda: self.start_scan("usage"),
+                                   bg="#3e3e5e", fg="white")
+        self.usage_btn.place(x=400, y=75)
+        
+        # Search inside text files instead of matching names
+        self.content_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Search file contents", variable=self.content_var,
+                       bg="#1e1e2f", fg="white", selectcolor="#2e2e3e", activebackground="#1e1e2f",
+                       activeforeground="white").place(x=10, y=75)
+        
+        # Ignore what earlier scans remembered and look at every folder again
+        self.full_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Full rescan", variable=self.full_var,
+                       bg="#1e1e2f", fg="white", selectcolor="#2e2e3e", activebackground="#1e1e2f",
+                       activeforeground="white").place(x=170, y=75)
+        
+        # Treat the search as a regular expression when searching contents
+        self.regex_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Regex", variable=self.regex_var,
+                       bg="#1e1e2f", fg="white", selectcolor="#2e2e3e", activebackground="#1e1e2f",
+                       activeforeground="white").place(x=275, y=75)
+        
         # Result listbox with scrollbar
         self.result_listbox = tk.Listbox(self.root, bg="#2e2e3e", fg="white", width=80, height=18, font=("Courier New", 10))
         self.result_listbox.place(x=10, y=110)
@@ -75,10 +126,9 @@ class FileScannerApp:
         self.preview_text.place(x=10, y=430)
         self.preview_text.config(state="disabled")
         
-        # Animation label
-        self.anim_label = tk.Label(self.root, text="", bg="#1e1e2f", fg="white")
-        self.anim_label.place(x=600, y=10)
-        self.anim_running = False
+        # Scan progress, next to the preview title
+        self.progress_label = tk.Label(self.root, text="", bg="#1e1e2f", fg="#b0b0c0")
+        self.progress_label.place(x=100, y=410)
         
     def browse_directory(self):
         directory = filedialog.askdirectory()
@@ -86,13 +136,33 @@ class FileScannerApp:
             self.dir_entry.delete(0, tk.END)
             self.dir_entry.insert(0, directory)
         
-    def start_scan(self):
+    def start_scan(self, mode="files"):
         directory = self.dir_entry.get().strip()
         if not os.path.isdir(directory):
             messagebox.showerror("Error", "Invalid directory")
             return
         self.search_term = self.search_entry.get().strip().lower()
         self.filter_key = self.filter_var.get()
+        self.full_scan = self.full_var.get()
+        # a regex is used as typed (lowering it would turn \S into \s); both still match ignoring case
+        self.grep_literal = not self.regex_var.get()
+        self.grep_pattern = self.search_term if self.grep_literal else self.search_entry.get().strip()
+        if self.content_var.get() and not self.grep_literal:
+            try:
+                re.compile(self.grep_pattern.encode("utf-8"))  # the workers search bytes
+            except re.error as e:
+                messagebox.showerror("Error", f"Invalid regular expression: {e}")
+                return
+        if self.engine is not None:
+            self.engine.cancel()  # a scan still running is superseded
+        if self.finder is not None:
+            self.finder.cancel()
+            self.finder = None
+        if self.grep is not None:
+            self.grep.cancel()
+            self.grep = None
+        if mode == "files" and self.content_var.get() and self.search_term:
+            mode = "content"
         self.stop_scanning.clear()
         self.result_listbox.delete(0, tk.END)
         self.preview_text.config(state="normal")
@@ -100,73 +170,160 @@ class FileScannerApp:
         self.preview_text.config(state="disabled")
         
         self.scan_btn.config(state="disabled")
+        self.dup_btn.config(state="disabled")
+        self.usage_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
-        self.anim_running = True
-        threading.Thread(target=self.animate, daemon=True).start()
         
-        threading.Thread(target=self.scan_files, args=(directory,), daemon=True).start()
+        self.scan_epoch = self.feed.new_epoch()
+        self.results = ResultStore()
+        if mode == "content":
+            # the search term is for the contents, so the walk only picks out text files
+            exts = TEXT_EXTS.intersection(FILE_TYPES.get(self.filter_key) or TEXT_EXTS)
+            match = name_matcher("", exts) if exts else (lambda name: False)
+        else:
+            match = self.types.matcher(self.search_term, self.filter_key)
+        self.engine = self.catalog.scan(directory, match, full=self.full_scan,
+                                        max_depth=SCAN_DEPTH, exclude=SCAN_EXCLUDE, symlinks=SCAN_SYMLINKS)
+        if mode == "duplicates":
+            self.finder = DuplicateFinder(())
+        elif mode == "content":
+            self.grep = ContentSearch((), self.grep_pattern, TEXT_EXTS, literal=self.grep_literal)
+        self.mode = mode
+        if mode == "usage":
+            self.progress.start(lambda: self.usage.scan)  # made by refresh() on the scan thread
+        else:
+            self.progress.start(self.engine, self.finder if mode == "duplicates" else self.grep)
+        target = {"files": self.scan_files, "duplicates": self.scan_duplicates, "usage": self.scan_usage,
+                  "content": self.scan_contents}[mode]
+        threading.Thread(target=target, args=(directory, self.scan_epoch, self.results), daemon=True).start()
         
     def stop_scan(self):
         self.stop_scanning.set()
+        if self.engine is not None:
+            self.engine.cancel()
+        if self.finder is not None:
+            self.finder.cancel()
+        if self.grep is not None:
+            self.grep.cancel()
+        if self.usage.scan is not None:
+            self.usage.scan.cancel()
         self.scan_btn.config(state="normal")
+        self.dup_btn.config(state="normal")
+        self.usage_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
-        self.anim_running = False
-        self.anim_label.config(text="")
+        self.progress.stop()
         
-    def scan_files(self, directory):
-        filter_exts = FILE_TYPES.get(self.filter_key)
-        try:
-            all_items = os.listdir(directory)
-        except Exception as e:
-            self.show_error(f"Cannot list directory: {e}")
-            self.stop_scan()
-            return
-        
-        self.files = []
+    def scan_files(self, directory, epoch, store):
+        self.engine.start()
         
         # Insert header with fixed width columns
         header = f"{'Index'.ljust(6)}|{'Size (KB)'.ljust(12)}| Path"
-        self.result_listbox.insert(tk.END, header)
-        self.result_listbox.insert(tk.END, "-" * 75)
+        store.add_rows([NO_RECORD, NO_RECORD])
+        self.feed.put(epoch, [header, "-" * 75])
         
-        index = 1
-        for item in all_items:
-            if self.stop_scanning.is_set():
-                break
-            
-            full_path = os.path.join(directory, item)
-            if os.path.isfile(full_path):
-                ext = os.path.splitext(item)[1].lower()
-                if (filter_exts is None or ext in filter_exts):
-                    if self.search_term == "all" or self.search_term == "" or self.search_term in item.lower():
-                        try:
-                            size = os.path.getsize(full_path)
-                            size_kb = size / 1024
-                        except:
-                            size_kb = 0
-                        # Format string with fixed widths for columns
-                        display_text = f"{str(index).ljust(6)}|{f'{size_kb:.2f}'.ljust(12)}| {item}"
-                        self.files.append(full_path)
-                        self.result_listbox.insert(tk.END, display_text)
-                        index += 1
-        
-        if not self.files and not self.stop_scanning.is_set():
-            self.result_listbox.insert(tk.END, "No files found.")
-        self.stop_scan()
+        for batch in self.engine.batches():
+            rows, ids = [], []
+            for full_path, size, mtime in self.types.select(batch, self.filter_key):
+                rid = store.add(full_path, size, mtime)
+                rel = os.path.relpath(full_path, directory)
+                # Format string with fixed widths for columns
+                rows.append(f"{str(rid + 1).ljust(6)}|{f'{size / 1024:.2f}'.ljust(12)}| {rel}")
+                ids.append(rid)
+            store.add_rows(ids)
+            self.feed.put(epoch, rows)
+        
+        if not len(store) and not self.stop_scanning.is_set():
+            store.add_rows([NO_RECORD])
+            self.feed.put(epoch, ["No files found."])
+        self.feed.call(epoch, self.stop_scan)
+        
+    def scan_duplicates(self, directory, epoch, store):
+        # same scan and filters, then size -> head/tail hash -> full hash
+        finder = self.finder
+        finder.records = [rec for batch in self.engine.start().batches()
+                          for rec in self.types.select(batch, self.filter_key)]
+        groups = finder.run()
+        if finder.stop.is_set():
+            return
+        
+        summary = f"{len(groups)} duplicate groups, {reclaimable(groups) / (1024 * 1024):.2f} MB reclaimable"
+        store.add_rows([NO_RECORD, NO_RECORD])
+        self.feed.put(epoch, [summary, "-" * 75])
+        for size, paths in groups:
+            rows = [f"------ {len(paths)} copies of {size / 1024:.2f} KB, "
+                    f"{size * (len(paths) - 1) / 1024:.2f} KB reclaimable ------"]
+            ids = [NO_RECORD]
+            for path in paths:
+                rid = store.add(path, size)
+                rows.append(f"{str(rid + 1).ljust(6)}|{f'{size / 1024:.2f}'.ljust(12)}| {os.path.relpath(path, directory)}")
+                ids.append(rid)
+            store.add_rows(ids)
+            self.feed.put(epoch, rows)
+        self.feed.call(epoch, self.stop_scan)
+        
+    def scan_contents(self, directory, epoch, store):
+        # text files from the walk go straight to the grep workers; hits show up as each file finishes
+        grep = self.grep
+        grep.records = (rec for batch in self.engine.start().batches() for rec in batch)
+        header = f"Files containing '{grep.pattern}'" if grep.literal else f"Files matching /{grep.pattern}/"
+        store.add_rows([NO_RECORD, NO_RECORD])
+        self.feed.put(epoch, [header, "-" * 75])
+        for path, size, mtime, hits in grep.results():
+            rid = store.add(path, size, mtime)
+            rel = os.path.relpath(path, directory)
+            rows = [f"{rel}:{line}: {text}" for line, text in hits]
+            store.add_rows([rid] * len(rows))  # every hit row previews its file
+            self.feed.put(epoch, rows)
+        
+        if not len(store) and not grep.stop.is_set():
+            store.add_rows([NO_RECORD])
+            self.feed.put(epoch, ["No matches found."])
+        self.feed.call(epoch, self.stop_scan)
+        
+    def scan_usage(self, directory, epoch, store):
+        # totals ignore the search and filter: they describe the whole folder
+        root = self.usage.refresh(directory, full=self.full_scan, exclude=SCAN_EXCLUDE)
+        if root is not None and not self.stop_scanning.is_set():
+            self.feed.call(epoch, self.show_usage, root.path)
+        self.feed.call(epoch, self.stop_scan)
+        
+    def show_usage(self, path):
+        # one level of the tree at a time; nothing below is formatted until the user drills in
+        node = self.usage.nodes.get(path)
+        if node is None:
+            return
+        cats = ", ".join(f"{name} {n}" for name, n in zip(self.usage.categories, node.cats) if n)
+        rows = [f"{path}  {human(node.total_bytes)} in {node.total_files} files", cats or "(empty)", "-" * 75]
+        self.usage_rows = [None, None, None]
+        parent = os.path.dirname(path)
+        if parent in self.usage.nodes and parent != path:
+            rows.append(f"{'..'.rjust(10)}  (up)")
+            self.usage_rows.append(parent)
+        for child in self.usage.children(path):
+            rows.append(f"{human(child.total_bytes).rjust(10)}  {str(child.total_files).rjust(8)} files  {child.name}{os.sep}")
+            self.usage_rows.append(child.path)
+        rows.append(f"{human(node.own_bytes).rjust(10)}  {str(node.own_files).rjust(8)} files  (in this folder)")
+        self.usage_rows.append(None)
+        self.result_listbox.delete(0, tk.END)
+        self.result_listbox.insert(tk.END, *rows)
         
     def preview_file(self, event):
         selection = self.result_listbox.curselection()
         if not selection:
             return
-        index = selection[0] - 2  # Adjust for header and separator lines
-        if index < 0 or index >= len(self.files):
+        if self.mode == "usage":
+            # double-click drills into a folder (or back up) instead of previewing
+            if selection[0] < len(self.usage_rows) and self.usage_rows[selection[0]]:
+                self.show_usage(self.usage_rows[selection[0]])
+            return
+        record = self.results.record(selection[0])  # None for header and separator rows
+        if record is None:
             return
-        filepath = self.files[index]
+        filepath = record[0]
         try:
             ext = os.path.splitext(filepath)[1].lower()
             # Preview only text-based files (txt, py, bat, etc.)
-            text_exts = ['.txt', '.py', '.bat', '.log', '.csv', '.json', '.md']
-            if ext in text_exts:
+            if ext in TEXT_EXTS:
                 with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
                     content = f.read(10000)  # preview up to 10k chars
                 self.preview_text.config(state="normal")
@@ -184,15 +341,6 @@ class FileScannerApp:
             self.preview_text.insert(tk.END, f"Error reading file: {e}")
             self.preview_text.config(state="disabled")
             
-    def animate(self):
-        animation = ["|", "/", "-", "\\"]
-        idx = 0
-        while self.anim_running:
-            self.anim_label.config(text=animation[idx])
-            idx = (idx + 1) % len(animation)
-            # sleep in main thread not good, so use after method
-            self.root.after(150)
-    
     def show_error(self, msg):
         messagebox.showerror("Error", msg)
 
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+PDF_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".file_scanner_pdf.db")
+WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))  # leave a core for the Tk loop
+PREVIEW_CHARS = 10000
+INDEX_PAGES = 50    # pages read per PDF for the full-text index
+
+def extract(path, pages=1):
+    # runs in a worker process: (first page text, text of up to `pages` pages)
+    try:
+        with open(path, "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            if not reader.pages:
+                return "(No pages)", ""
+            texts = []
+            for page in reader.pages[:pages]:
+                try:
+                    texts.append(page.extract_text() or "")
+                except Exception:
+                    texts.append("")
+    except Exception as e:
+        return f"Error reading file: {e}", ""
+    return (texts[0] or "(No text extracted)")[:PREVIEW_CHARS], "\n".join(texts)
+
+class PdfText:
+    # PDF text extracted off the Tk thread and kept in SQLite by path+mtime.
+    # on_ready(path, mtime, text) is called from a pool thread when an extraction lands.
+    # With index=True every extraction also reads the body into a full-text index.
+    def __init__(self, on_ready=None, index=False, path=PDF_CACHE_PATH, workers=WORKERS):
+        self.available = PyPDF2 is not None
+        self.on_ready = on_ready
+        self.index = index
+        self.path = path
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pending = {}    # (path, mtime) -> future
+        self.pool = None
+        db = self.connect()
+        db.execute("CREATE TABLE IF NOT EXISTS pdfs (path TEXT PRIMARY KEY, mtime REAL NOT NULL, "
+                   "preview TEXT NOT NULL, body TEXT)")
+        try:
+            db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pdf_fts USING fts5(path UNINDEXED, body)")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False     # no FTS5 in this sqlite build, search falls back to LIKE
+        db.commit()
+        db.close()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get(self, path, mtime):
+        # cached preview text, or None (then request() it)
+        db = self.connect()
+        try:
+            row = db.execute("SELECT preview FROM pdfs WHERE path = ? AND mtime = ?", (path, mtime)).fetchone()
+        finally:
+            db.close()
+        return row[0] if row else None
+
+    def request(self, path, mtime):
+        # queue an extraction unless one is cached or already running
+        if not self.available:
+            return
+        key = (path, mtime)
+        with self.lock:
+            if key in self.pending:
+                return
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            fut = self.pool.submit(extract, path, INDEX_PAGES if self.index else 1)
+            self.pending[key] = fut
+        fut.add_done_callback(lambda f: self._done(key, f))
+
+    def prefetch(self, records):
+        # (path, mtime) pairs, e.g. the rows on screen; only the ones not cached are queued
+        if not self.available or not records:
+            return
+        db = self.connect()
+        try:
+            for path, mtime in records:
+                row = db.execute("SELECT body IS NOT NULL FROM pdfs WHERE path = ? AND mtime = ?",
+                                 (path, mtime)).fetchone()
+                if row is None or (self.index and not row[0]):   # cached before indexing was on
+                    self.request(path, mtime)
+        finally:
+            db.close()
+
+    def cancel(self):
+        # drop queued extractions (running ones finish and are still cached)
+        with self.lock:
+            queued = list(self.pending.values())
+        for fut in queued:
+            fut.cancel()   # outside the lock: a cancelled future runs _done right away
+
+    def _done(self, key, fut):
+        with self.lock:
+            self.pending.pop(key, None)
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        preview, body = fut.result()
+        path, mtime = key
+        db = self.connect()
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO pdfs (path, mtime, preview, body) VALUES (?, ?, ?, ?)",
+                           (path, mtime, preview, body if self.index else None))
+                if self.index and self.fts:
+                    db.execute("DELETE FROM pdf_fts WHERE path = ?", (path,))
+                    db.execute("INSERT INTO pdf_fts (path, body) VALUES (?, ?)", (path, body))
+        finally:
+            db.close()
+        if self.on_ready is not None:
+            self.on_ready(path, mtime, preview)
+
+    def search(self, term, root=None):
+        # paths of indexed PDFs whose text contains term, optionally only under root
+        term = term.strip()
+        if not term:
+            return []
+        db = self.connect()
+        try:
+            if self.fts:
+                quoted = '"' + term.replace('"', '""') + '"'
+                rows = db.execute("SELECT path FROM pdf_fts WHERE pdf_fts MATCH ?", (quoted,)).fetchall()
+            else:
+                rows = db.execute("SELECT path FROM pdfs WHERE body LIKE ?", (f"%{term}%",)).fetchall()
+        finally:
+            db.close()
+        paths = [r[0] for r in rows]
+        if root is not None:
+            prefix = root if root.endswith(os.sep) else root + os.sep
+            paths = [p for p in paths if p.startswith(prefix)]
+        return paths
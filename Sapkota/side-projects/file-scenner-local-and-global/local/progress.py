@@ -0,0 +1,91 @@
+import time
+from disk_usage import human
+
+TICK_MS = 200
+SPINNER = "|/-\\"
+SMOOTHING = 0.3   # weight of the newest sample in the dirs/s average
+
+class ScanProgress:
+    # Live scan status in a label, redrawn by after() on the Tk thread. It only reads
+    # the counters the scan objects publish (engine, duplicate finder, content search),
+    # so the workers never touch a widget and nothing sleeps on the Tk loop.
+    def __init__(self, root, label, prefix="", tick_ms=TICK_MS):
+        self.root = root
+        self.label = label
+        self.prefix = prefix
+        self.tick_ms = tick_ms
+        self.sources = ()
+        self.job = None
+        self.frame = 0
+        self.rate = 0.0
+        self.last = None   # (time, dirs) at the previous tick
+
+    def start(self, *sources):
+        # each source is a scan object, or a callable returning one (or None) for
+        # objects created later on the scan thread
+        self.stop()
+        self.sources = sources
+        self.frame = 0
+        self.rate = 0.0
+        self.last = None
+        self._tick()
+
+    def stop(self, text=None):
+        # freeze on a summary of what the scan did (or on text)
+        if self.job is not None:
+            self.root.after_cancel(self.job)
+            self.job = None
+        if text is None:
+            text = self._summary() if self.sources else ""
+        self.label.config(text=text)
+
+    def _objects(self):
+        for source in self.sources:
+            obj = source() if callable(source) else source
+            if obj is not None:
+                yield obj
+
+    def _tick(self):
+        self.frame = (self.frame + 1) % len(SPINNER)
+        parts = []
+        for obj in self._objects():
+            if hasattr(obj, "dirs_scanned"):
+                parts.append(self._walk(obj))
+            elif hasattr(obj, "stage"):
+                if obj.stage:
+                    parts.append(f"hashing: {obj.stage}, {obj.files_hashed}/{obj.candidates} files, "
+                                 f"{human(obj.bytes_read)} read")
+            elif hasattr(obj, "files_searched"):
+                parts.append(f"searched {obj.files_searched} files ({human(obj.bytes_searched)}), "
+                             f"{obj.files_matched} with hits")
+        self.label.config(text=f"{self.prefix}{SPINNER[self.frame]} " + "  |  ".join(p for p in parts if p))
+        self.job = self.root.after(self.tick_ms, self._tick)
+
+    def _walk(self, engine):
+        if not engine.started:
+            return "starting..."
+        now, dirs = time.time(), engine.dirs_scanned
+        if self.last is not None and now > self.last[0]:
+            sample = (dirs - self.last[1]) / (now - self.last[0])
+            self.rate = sample if not self.rate else SMOOTHING * sample + (1 - SMOOTHING) * self.rate
+        self.last = (now, dirs)
+        text = (f"{dirs} dirs ({self.rate:.0f}/s), {engine.files_seen} files, "
+                f"{engine.files_matched} matched, {human(engine.bytes_matched)}")
+        if engine.errors:
+            text += f", {engine.errors} errors"
+        # a rescan knows roughly how many folders to expect from last time
+        expected = getattr(engine, "expected_dirs", None)
+        if expected and not engine.finished and self.rate > 0 and dirs < expected:
+            text += f", ETA {(expected - dirs) / self.rate:.0f} s"
+        return text
+
+    def _summary(self):
+        parts = []
+        for obj in self._objects():
+            if hasattr(obj, "dirs_scanned") and obj.started:
+                elapsed = (obj.finished or time.time()) - obj.started
+                parts.append(f"{obj.dirs_scanned} dirs in {elapsed:.1f} s, {obj.files_matched} matched, "
+                             f"{human(obj.bytes_matched)}")
+            elif hasattr(obj, "files_searched"):
+                parts.append(f"{obj.files_matched} of {obj.files_searched} files with hits")
+        return "  |  ".join(parts)
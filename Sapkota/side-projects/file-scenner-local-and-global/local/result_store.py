@@ -0,0 +1,39 @@
+from array import array
+
+NO_RECORD = -1   # row id of headers, separators and messages
+
+class ResultStore:
+    # scan results as parallel arrays, plus listbox row -> record id.
+    # The scan thread appends rows in the same order it hands them to the feed,
+    # so row numbers here line up with the listbox.
+    def __init__(self, categories=("Other",)):
+        self.categories = list(categories)
+        self.paths = []
+        self.sizes = array('Q')
+        self.mtimes = array('d')
+        self.cats = array('B')
+        self.rows = array('i')
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, path, size, mtime=0.0, category=0):
+        rid = len(self.paths)
+        self.paths.append(path)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.cats.append(category)
+        return rid
+
+    def add_rows(self, ids):
+        # one entry per listbox row, NO_RECORD for rows that are not files
+        self.rows.extend(ids)
+
+    def record(self, row):
+        # (path, size, mtime, category name) behind a listbox row, or None
+        if not 0 <= row < len(self.rows):
+            return None
+        rid = self.rows[row]
+        if rid == NO_RECORD:
+            return None
+        return self.paths[rid], self.sizes[rid], self.mtimes[rid], self.categories[self.cats[rid]]
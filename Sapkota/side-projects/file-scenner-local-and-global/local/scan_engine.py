@@ -0,0 +1,201 @@
+import os
+import re
+import queue
+import stat
+import threading
+import time
+import fnmatch
+from collections import deque
+
+WORKERS = min(32, (os.cpu_count() or 1) * 4)  # scandir waits on the disk, not the CPU
+BATCH_SIZE = 500       # files handed to the consumer at once
+FLUSH_INTERVAL = 0.1   # ...or whatever a worker has after this many seconds
+DONE = None            # sentinel on the results queue
+
+class ScanEngine:
+    # recursive scandir walk over a work-stealing thread pool, no UI code in here.
+    # results: lists of (path, size, mtime) on self.results, then DONE.
+    # symlinks: "skip" ignores them, "files" lists linked files but never descends
+    # into linked dirs, "follow" descends too (each real dir visited once).
+    def __init__(self, roots, match=None, max_depth=None, exclude=(), symlinks="files",
+                 workers=WORKERS, batch_size=BATCH_SIZE):
+        self.roots = [roots] if isinstance(roots, str) else list(roots)
+        self.match = match              # name -> bool, checked before any stat
+        self.max_depth = max_depth      # 0 = only the roots themselves
+        self.exclude = re.compile("|".join(fnmatch.translate(p) for p in exclude)) if exclude else None
+        self.symlinks = symlinks
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.results = queue.Queue()
+        self.stop = threading.Event()
+        self.deques = [deque() for _ in range(self.workers)]
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.pending = 0    # directories queued or being read
+        self.running = 0    # worker threads still alive
+        self.seen = set()   # (dev, ino) of dirs entered, only used when following links
+        # counters, read by the UI while a scan runs
+        self.dirs_scanned = 0
+        self.files_seen = 0
+        self.files_matched = 0
+        self.bytes_matched = 0
+        self.errors = 0
+        self.started = 0.0
+        self.finished = 0.0
+
+    def start(self):
+        self.started = time.time()
+        if self.symlinks == "follow":
+            for root in self.roots:
+                self._first_visit(root)
+        for i, root in enumerate(self.roots):
+            self.deques[i % self.workers].append((root, 0))
+        self.pending = len(self.roots)
+        self.running = self.workers
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, args=(i,), daemon=True).start()
+        return self
+
+    def cancel(self):
+        self.stop.set()
+        with self.wake:
+            self.wake.notify_all()
+
+    def batches(self):
+        # blocking iterator over result batches until the scan ends
+        while True:
+            batch = self.results.get()
+            if batch is DONE:
+                return
+            yield batch
+
+    def run(self):
+        # convenience: scan to completion on the caller's thread
+        self.start()
+        return [rec for batch in self.batches() for rec in batch]
+
+    def _take(self, i):
+        # own deque from the newest end (depth first, warm caches), others from the oldest end
+        try:
+            return self.deques[i].pop()
+        except IndexError:
+            pass
+        for k in range(1, self.workers):
+            try:
+                return self.deques[(i + k) % self.workers].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _worker(self, i):
+        batch, flushed = [], time.time()
+        try:
+            while not self.stop.is_set():
+                item = self._take(i)
+                if item is None:
+                    with self.wake:
+                        if self.pending == 0:
+                            self.wake.notify_all()
+                            return
+                        self.wake.wait(0.05)
+                    continue
+                try:
+                    self._scan_dir(i, item[0], item[1], batch)
+                finally:
+                    with self.wake:
+                        self.pending -= 1
+                        if self.pending == 0:
+                            self.wake.notify_all()
+                if len(batch) >= self.batch_size or (batch and time.time() - flushed > FLUSH_INTERVAL):
+                    self.results.put(batch)
+                    batch, flushed = [], time.time()
+        finally:
+            if batch:
+                self.results.put(batch)
+            with self.lock:
+                self.running -= 1
+                last = self.running == 0
+            if last:
+                self.finished = time.time()
+                self.results.put(DONE)
+
+    def _scan_dir(self, i, path, depth, batch):
+        descend = self.max_depth is None or depth < self.max_depth
+        subdirs = []
+        seen = matched = size = errors = 0
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    name = entry.name
+                    if self.exclude is not None and self.exclude.match(name):
+                        continue
+                    try:
+                        link = entry.is_symlink()
+                        if link and self.symlinks == "skip":
+                            continue
+                        if entry.is_dir(follow_symlinks=not link or self.symlinks == "follow"):
+                            if descend:
+                                subdirs.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        seen += 1
+                        if self.match is not None and not self.match(name):
+                            continue
+                        st = entry.stat()  # cached on Windows, one syscall elsewhere
+                    except OSError:
+                        errors += 1
+                        continue
+                    matched += 1
+                    size += st.st_size
+                    batch.append((entry.path, st.st_size, st.st_mtime))
+        except OSError:
+            with self.lock:
+                self.errors += 1
+            return
+        # counters are bumped once per directory so the lock stays cold
+        with self.lock:
+            self.dirs_scanned += 1
+            self.files_seen += seen
+            self.files_matched += matched
+            self.bytes_matched += size
+            self.errors += errors
+        self._push(i, subdirs, depth + 1)
+
+    def _push(self, i, subdirs, depth):
+        # queue directories on worker i's own deque, where idle workers can steal them
+        if self.symlinks == "follow":
+            subdirs = [d for d in subdirs if self._first_visit(d)]
+        if subdirs:
+            with self.wake:
+                self.pending += len(subdirs)
+                self.wake.notify_all()
+            self.deques[i].extend((d, depth) for d in subdirs)
+
+    def _first_visit(self, path):
+        # followed links can form cycles; identify real directories by device and inode
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if not stat.S_ISDIR(st.st_mode):
+            return False
+        key = (st.st_dev, st.st_ino)
+        with self.lock:
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+            return True
+
+def name_matcher(search, exts=None):
+    # the scanner's usual filter: optional extension set plus a substring ("all"/"" = any name)
+    search = search.strip().lower()
+    any_name = search in ("", "all")
+    exts = frozenset(exts) if exts else None
+
+    def match(name):
+        lower = name.lower()
+        if exts is not None and os.path.splitext(lower)[1] not in exts:
+            return False
+        return any_name or search in lower
+    return match
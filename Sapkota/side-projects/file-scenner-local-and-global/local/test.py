@@ -2,14 +2,15 @@ import os
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-from file_types import FILE_TYPES
-import time
+from file_types import FILE_TYPES, TEXT_EXTS, Classifier
+from catalog import Catalog
+from ui_feed import ListboxFeed
+from result_store import ResultStore, NO_RECORD
+from pdf_text import PdfText
+from progress import ScanProgress
 
-# For PDF preview
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
+# PDF text is extracted in the background; with the index on, searches also match PDF contents
+PDF_INDEX = False
 
 class FileScannerApp:
     def __init__(self, root):
@@ -19,14 +20,24 @@ class FileScannerApp:
         self.root.config(bg="#1e1e2f")
         
         self.stop_scanning = threading.Event()
-        self.files = []  # list of tuples (filepath, category)
+        self.results = ResultStore()  # listbox row -> (path, size, mtime, category)
+        self.engine = None
+        self.types = Classifier()
+        self.catalog = Catalog()  # repeat scans only re-list folders that changed
+        self.pdf = PdfText(on_ready=self.pdf_ready, index=PDF_INDEX)
+        self.preview_key = None   # (path, mtime) of the PDF the preview is waiting for
+        self.prefetch_job = None
         
         self.create_widgets()
+        self.feed = ListboxFeed(self.root, self.result_listbox)
+        self.progress = ScanProgress(self.root, self.anim_label)
+        self.scan_epoch = 0
         
         # Remove directory input, so use fixed scan directory
         self.scan_directory = "C:\\"  # change this as you want
         # Show it somewhere in title or anim label:
         self.anim_label.config(text=f"Scanning: {self.scan_directory}")
+        self.progress.prefix = f"Scanning: {self.scan_directory} "
         
     def create_widgets(self):
         # Remove directory input and browse button, keep search and filter
@@ -57,6 +68,12 @@ class FileScannerApp:
         self.stop_btn.place(x=580, y=45)
         self.stop_btn.config(state="disabled")
         
+        # Re-list every folder instead of trusting the catalog (files rewritten in place)
+        self.full_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Full rescan", variable=self.full_var,
+                       bg="#1e1e2f", fg="white", selectcolor="#2e2e3e", activebackground="#1e1e2f",
+                       activeforeground="white").place(x=470, y=45)
+        
         # Result listbox with scrollbar
         self.result_listbox = tk.Listbox(self.root, bg="#2e2e3e", fg="white", width=80, height=22, font=("Courier New", 10))
         self.result_listbox.place(x=10, y=75)
@@ -64,7 +81,8 @@ class FileScannerApp:
         
         scrollbar = tk.Scrollbar(self.root, command=self.result_listbox.yview)
         scrollbar.place(x=665, y=75, height=360)
-        self.result_listbox.config(yscrollcommand=scrollbar.set)
+        self.scrollbar = scrollbar
+        self.result_listbox.config(yscrollcommand=self.on_scroll)
         
         # Preview text box
         tk.Label(self.root, text="File Preview:", bg="#1e1e2f", fg="white").place(x=10, y=440)
@@ -72,12 +90,15 @@ class FileScannerApp:
         self.preview_text.place(x=10, y=460)
         self.preview_text.config(state="disabled")
         
-        # Animation label (used to show scanning directory)
+        # Animation label (used to show scanning directory and progress)
         self.anim_label = tk.Label(self.root, text="", bg="#1e1e2f", fg="white")
         self.anim_label.place(x=10, y=40)
-        self.anim_running = False
         
     def start_scan(self):
+        if self.engine is not None:
+            self.engine.cancel()  # a scan still running is superseded
+        self.pdf.cancel()
+        self.preview_key = None
         self.stop_scanning.clear()
         self.result_listbox.delete(0, tk.END)
         self.preview_text.config(state="normal")
@@ -86,40 +107,34 @@ class FileScannerApp:
         
         self.scan_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
-        self.anim_running = True
-        
-        self.anim_label.config(text=f"Scanning: {self.scan_directory}")
         
-        threading.Thread(target=self.animate, daemon=True).start()
-        threading.Thread(target=self.scan_files, args=(self.scan_directory,), daemon=True).start()
+        # widgets are read here, on the Tk thread; the scan thread only gets plain values
+        self.scan_epoch = self.feed.new_epoch()
+        category = self.filter_var.get()
+        term = self.search_entry.get().strip()
+        match = self.types.matcher(term, category)
+        # made here rather than on the scan thread, so Stop always has the current engine
+        self.engine = self.catalog.scan(self.scan_directory, match, full=self.full_var.get())
+        self.progress.start(self.engine)
+        self.results = ResultStore(("PDF", "Image", "Other"))
+        threading.Thread(target=self.scan_files, args=(self.scan_directory, self.engine, category, term, self.scan_epoch, self.results),
+                         daemon=True).start()
         
     def stop_scan(self):
         self.stop_scanning.set()
+        if self.engine is not None:
+            self.engine.cancel()
         self.scan_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
-        self.anim_running = False
-        self.anim_label.config(text="")
-        
-    def is_at_bottom(self):
-        total = self.result_listbox.size()
-        if total == 0:
-            return True
-        last_visible = self.result_listbox.nearest(self.result_listbox.winfo_height())
-        return last_visible >= total - 1
-
-    def insert_result(self, text):
-        at_bottom = self.is_at_bottom()
-        self.result_listbox.insert(tk.END, text)
-        if at_bottom:
-            self.result_listbox.see(tk.END)
-        self.result_listbox.update_idletasks()
-        
-    def scan_files(self, directory):
-        filter_exts = FILE_TYPES.get(self.filter_var.get())
-        search_str = self.search_entry.get().strip().lower()
+        self.progress.stop()
         
-        self.files.clear()
+    def insert_result(self, epoch, store, rows, ids=None):
+        # safe from any thread: rows reach the listbox in batches via the feed,
+        # and the store learns which record (if any) each row shows
+        store.add_rows(ids if ids is not None else [NO_RECORD] * len(rows))
+        self.feed.put(epoch, rows)
         
+    def scan_files(self, directory, engine, category, term, epoch, store):
         # We will collect files by categories
         pdf_files = []
         image_files = []
@@ -128,110 +143,78 @@ class FileScannerApp:
         # Define image extensions (can expand as needed)
         image_exts = [".png", ".jpg", ".jpeg", ".gif", ".bmp"]
         
-        # Recursive scan
-        for root_dir, dirs, files in os.walk(directory):
-            if self.stop_scanning.is_set():
-                break
-            folder_name = os.path.basename(root_dir) or root_dir
-            self.insert_result(f"------------- {folder_name} -------------")
-            
-            for fname in files:
-                if self.stop_scanning.is_set():
-                    break
-                ext = os.path.splitext(fname)[1].lower()
-                if (filter_exts is None or ext in filter_exts):
-                    if search_str == "all" or search_str == "" or search_str in fname.lower():
-                        full_path = os.path.join(root_dir, fname)
-                        try:
-                            size_kb = os.path.getsize(full_path) / 1024
-                        except:
-                            size_kb = 0
-                        display_text = f"{fname.ljust(40)} {size_kb:8.2f} KB"
-                        
-                        if ext == ".pdf":
-                            pdf_files.append((display_text, full_path))
-                        elif ext in image_exts:
-                            image_files.append((display_text, full_path))
-                        else:
-                            other_files.append((display_text, full_path))
-            
-            self.insert_result("_" * 65)
-            time.sleep(0.01)
+        # Incremental refresh of the catalog on the engine's thread pool, then a catalog query
+        engine.start()
+        for batch in engine.batches():
+            for full_path, size, mtime in self.types.select(batch, category):
+                ext = os.path.splitext(full_path)[1].lower()
+                if ext == ".pdf":
+                    pdf_files.append(store.add(full_path, size, mtime, 0))
+                elif ext in image_exts:
+                    image_files.append(store.add(full_path, size, mtime, 1))
+                else:
+                    other_files.append(store.add(full_path, size, mtime, 2))
         
-        def display_group(title, files):
-            self.insert_result(f"------------- {title} -------------")
-            if files:
-                for text, path in files:
-                    if self.stop_scanning.is_set():
-                        break
-                    self.files.append(path)
-                    self.insert_result(text)
-                    time.sleep(0.02)
+        def display_group(title, rids):
+            self.insert_result(epoch, store, [f"------------- {title} -------------"])
+            if rids:
+                rows = [f"{os.path.basename(store.paths[i]).ljust(40)} {store.sizes[i] / 1024:8.2f} KB" for i in rids]
+                self.insert_result(epoch, store, rows, rids)
             else:
-                self.insert_result("No files found in this category.")
-            self.insert_result("_" * 65)
+                self.insert_result(epoch, store, ["No files found in this category."])
+            self.insert_result(epoch, store, ["_" * 65])
         
         # Show grouped results
         if not self.stop_scanning.is_set():
             display_group("PDF Files", pdf_files)
             display_group("Image Files", image_files)
             display_group("Other Files", other_files)
-        
-        if not self.files and not self.stop_scanning.is_set():
-            self.insert_result("No files found.")
-        
-        self.stop_scan()
+            if PDF_INDEX:
+                # PDFs indexed so far (this scan's are queued below) whose text has the term
+                mentions = []
+                for path in self.pdf.search(term, directory) if term.lower() not in ("", "all") else ():
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    mentions.append(store.add(path, st.st_size, st.st_mtime, 0))
+                if mentions:
+                    display_group(f"PDFs mentioning '{term}'", mentions)
+                self.pdf.prefetch([(store.paths[i], store.mtimes[i]) for i in pdf_files])
+            self.feed.call(epoch, self.prefetch_visible)
+        
+        if not len(store) and not self.stop_scanning.is_set():
+            self.insert_result(epoch, store, ["No files found."])
+        
+        self.feed.call(epoch, self.stop_scan)
         
     def preview_file(self, event):
         selection = self.result_listbox.curselection()
         if not selection:
             return
-        index = selection[0]
-        
-        # Map index to file in self.files by skipping header/separator lines
-        # We'll do a simple linear scan here because headers break list continuity
-        
-        line = self.result_listbox.get(index)
-        # If line is a header or separator, ignore preview
-        if line.startswith("-------------") or set(line.strip()) == {"_"}:
-            return
-        
-        # Find file path by matching displayed text
-        # The file lines have format: "filename padded size KB"
-        # So just find the first file with matching text (could be improved)
-        try:
-            file_path = None
-            for fpath in self.files:
-                fname = os.path.basename(fpath)
-                size_kb = os.path.getsize(fpath) / 1024
-                display_text = f"{fname.ljust(40)} {size_kb:8.2f} KB"
-                if display_text == line:
-                    file_path = fpath
-                    break
-            if not file_path:
-                return
-        except Exception:
+        # Headers, separators and messages map to no record
+        record = self.results.record(selection[0])
+        if record is None:
             return
+        file_path = record[0]
         
         ext = os.path.splitext(file_path)[1].lower()
+        self.preview_key = None
         try:
-            if ext == ".pdf" and PyPDF2 is not None:
-                # Extract text from first page for preview
-                with open(file_path, "rb") as f:
-                    reader = PyPDF2.PdfReader(f)
-                    if reader.pages:
-                        page = reader.pages[0]
-                        content = page.extract_text() or "(No text extracted)"
-                    else:
-                        content = "(No pages)"
+            if ext == ".pdf" and self.pdf.available:
+                # First page text comes from the cache, or from a worker process a moment later
+                content = self.pdf.get(file_path, record[2])
+                if content is None:
+                    self.preview_key = (file_path, record[2])
+                    self.pdf.request(file_path, record[2])
+                    content = "Extracting text..."
                 self.preview_text.config(state="normal")
                 self.preview_text.delete("1.0", tk.END)
-                self.preview_text.insert(tk.END, content[:10000])  # limit preview size
+                self.preview_text.insert(tk.END, content)
                 self.preview_text.config(state="disabled")
             else:
                 # For text files
-                text_exts = ['.txt', '.py', '.bat', '.log', '.csv', '.json', '.md']
-                if ext in text_exts:
+                if ext in TEXT_EXTS:
                     with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
                         content = f.read(10000)
                     self.preview_text.config(state="normal")
@@ -249,14 +232,34 @@ class FileScannerApp:
             self.preview_text.insert(tk.END, f"Error reading file: {e}")
             self.preview_text.config(state="disabled")
             
-    def animate(self):
-        animation = ["|", "/", "-", "\\"]
-        idx = 0
-        while self.anim_running:
-            self.anim_label.config(text=f"Scanning: {self.scan_directory} {animation[idx]}")
-            idx = (idx + 1) % len(animation)
-            time.sleep(0.15)
-    
+    def pdf_ready(self, path, mtime, text):
+        # pool thread: hand the text to the Tk loop
+        self.feed.call(self.scan_epoch, self.show_pdf, path, mtime, text)
+        
+    def show_pdf(self, path, mtime, text):
+        if self.preview_key != (path, mtime):
+            return  # the user has moved on to another row
+        self.preview_key = None
+        self.preview_text.config(state="normal")
+        self.preview_text.delete("1.0", tk.END)
+        self.preview_text.insert(tk.END, text)
+        self.preview_text.config(state="disabled")
+        
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.prefetch_job is not None:
+            self.root.after_cancel(self.prefetch_job)
+        self.prefetch_job = self.root.after(200, self.prefetch_visible)  # once scrolling settles
+        
+    def prefetch_visible(self):
+        # extract the PDFs on screen before anyone double-clicks them
+        self.prefetch_job = None
+        top = self.result_listbox.nearest(0)
+        bottom = self.result_listbox.nearest(self.result_listbox.winfo_height())
+        records = [self.results.record(row) for row in range(top, bottom + 1)]
+        self.pdf.prefetch([(r[0], r[2]) for r in records
+                           if r is not None and r[0].lower().endswith(".pdf")])
+        
     def show_error(self, msg):
         messagebox.showerror("Error", msg)
 
@@ -0,0 +1,74 @@
+import queue
+import tkinter as tk
+
+ROWS_PER_TICK = 3000   # listbox rows inserted per frame
+TICK_MS = 16
+
+class ListboxFeed:
+    # scan threads put rows (and callbacks) here; the Tk loop drains them with after().
+    # Nothing but the Tk thread ever touches the listbox.
+    def __init__(self, root, listbox, rows_per_tick=ROWS_PER_TICK, tick_ms=TICK_MS):
+        self.root = root
+        self.listbox = listbox
+        self.rows_per_tick = rows_per_tick
+        self.tick_ms = tick_ms
+        self.queue = queue.Queue()
+        self.held = None     # the part of a queue entry that did not fit in the last frame
+        self.epoch = 0
+        self.root.after(self.tick_ms, self._drain)
+
+    def new_epoch(self):
+        # Tk thread: forget whatever an older scan still has queued
+        self.epoch += 1
+        return self.epoch
+
+    def put(self, epoch, rows):
+        # any thread; rows is a list of strings, queued in frame-sized pieces
+        for i in range(0, len(rows), self.rows_per_tick):
+            self.queue.put((epoch, rows[i:i + self.rows_per_tick], None))
+
+    def call(self, epoch, fn, *args):
+        # any thread; runs fn on the Tk thread after the rows queued before it
+        self.queue.put((epoch, None, (fn, args)))
+
+    def at_bottom(self):
+        return self.listbox.size() == 0 or self.listbox.yview()[1] >= 0.999
+
+    def _drain(self):
+        try:
+            batch, calls = [], []
+            while len(batch) < self.rows_per_tick:
+                if self.held is not None:
+                    (epoch, rows, fn), self.held = self.held, None
+                else:
+                    try:
+                        epoch, rows, fn = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if epoch != self.epoch:
+                    continue
+                if fn is not None:
+                    calls.append((len(batch), fn))
+                    continue
+                room = self.rows_per_tick - len(batch)
+                if len(rows) > room:
+                    # the cap is on rows, so the rest waits for the next frame
+                    self.held = (epoch, rows[room:], None)
+                    rows = rows[:room]
+                batch.extend(rows)
+            self._flush(batch, calls)
+        finally:
+            self.root.after(self.tick_ms, self._drain)
+
+    def _flush(self, batch, calls):
+        follow = self.at_bottom()  # decided once per frame, not per row
+        done = 0
+        for upto, (fn, args) in calls:
+            if upto > done:
+                self.listbox.insert(tk.END, *batch[done:upto])
+                done = upto
+            fn(*args)
+        if len(batch) > done:
+            self.listbox.insert(tk.END, *batch[done:])
+        if batch and follow:
+            self.listbox.see(tk.END)